@@ -12,8 +12,30 @@ from .forms.forms import  images
 # from .models.models import db
 
 from .extensions import db
+from . import database, instrumentation, storage, fragments
+from .search import search_cli
+from .jobs import jobs_cli
+from .importer import bills_cli
+from .listing import listing_cli
+from .rollups import rollups_cli
+from .tokens import tokens_cli
 
-from .config import SECRET_KEY, DB_URL, UPLOAD_DESTINATION
+from .config import (SECRET_KEY, DB_URL, UPLOAD_DESTINATION, 
+                     DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+                     DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT, SQLITE_JOURNAL_MODE,
+                     SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT, SQLITE_MMAP_SIZE,
+                     QUERY_LIMITS, QUERY_LIMIT_RAISE, CACHE_VERSION_TTL,
+                     API_TOKEN_CACHE_TTL, API_TOKEN_CACHE_SIZE, API_PAGE_CACHE_SIZE,
+                     API_PAGE_CACHE_TTL, TAG_FILTER_MAX_IDS,
+                     FACET_COUNT_CACHE_SIZE, FACET_COUNT_CACHE_TTL,
+                     METRICS_ENABLED, METRICS_TOKEN, METRICS_BUCKETS, SLOW_REQUEST_MS,
+                     SLOW_REQUEST_SAMPLE_INTERVAL, SLOW_REQUEST_PROFILE_DIR,
+                     SEARCH_LANGUAGE,
+                     MAX_CONTENT_LENGTH, MAX_FILE_SIZE, UPLOAD_CHUNK_SIZE,
+                     FILE_OFFLOAD, FILE_OFFLOAD_PREFIX, FILE_MAX_AGE,
+                     JOB_MAX_ATTEMPTS, JOB_TIMEOUT, FILE_REAP_BATCH_SIZE,
+                     PREVIEW_WIDTHS, PREVIEW_CACHE_MAX_BYTES,
+                     FRAGMENT_CACHE, FRAGMENT_CACHE_MAX_ENTRIES, FRAGMENT_CACHE_DIR)
 
 #Blueprints
 from .blueprints.roles import roles_blueprint
@@ -23,6 +45,8 @@ from .blueprints.bills import bills_blueprint
 from .blueprints.doc_types import doc_types_blueprint
 from .blueprints.tags import tags_blueprint
 from .blueprints.create_db import db_blueprint
+from .blueprints.api import api_blueprint
+from .blueprints.dashboard import dashboard_blueprint
 
 def create_app(test_config=None):
     # create and configure the app
@@ -35,14 +59,94 @@ def create_app(test_config=None):
     app.config['UPLOADS_DEFAULT_DEST'] = UPLOAD_DESTINATION
     configure_uploads(app, (images, ))
 
+    # Upload size caps, uploads are hashed and spooled next to their final location
+    app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+    app.config['MAX_FILE_SIZE'] = MAX_FILE_SIZE
+    app.config['UPLOAD_CHUNK_SIZE'] = UPLOAD_CHUNK_SIZE
+    storage.init_app(app)
+
+    # Downloads
+    app.config['FILE_OFFLOAD'] = FILE_OFFLOAD
+    app.config['FILE_OFFLOAD_PREFIX'] = FILE_OFFLOAD_PREFIX
+    app.config['FILE_MAX_AGE'] = FILE_MAX_AGE
+    app.config['PREVIEW_WIDTHS'] = PREVIEW_WIDTHS
+    app.config['PREVIEW_CACHE_MAX_BYTES'] = PREVIEW_CACHE_MAX_BYTES
+
+    # Rendered document details
+    app.config['FRAGMENT_CACHE'] = FRAGMENT_CACHE
+    app.config['FRAGMENT_CACHE_MAX_ENTRIES'] = FRAGMENT_CACHE_MAX_ENTRIES
+    app.config['FRAGMENT_CACHE_DIR'] = FRAGMENT_CACHE_DIR
+
+    # Background jobs
+    app.config['JOB_MAX_ATTEMPTS'] = JOB_MAX_ATTEMPTS
+    app.config['JOB_TIMEOUT'] = JOB_TIMEOUT
+    app.config['FILE_REAP_BATCH_SIZE'] = FILE_REAP_BATCH_SIZE
+
     # CONNECT TO DB
     app.config['SQLALCHEMY_DATABASE_URI'] = DB_URL
 
+    # Engine tuning, turned into SQLALCHEMY_ENGINE_OPTIONS and SQLite pragmas
+    app.config['DB_POOL_SIZE'] = DB_POOL_SIZE
+    app.config['DB_MAX_OVERFLOW'] = DB_MAX_OVERFLOW
+    app.config['DB_POOL_TIMEOUT'] = DB_POOL_TIMEOUT
+    app.config['DB_POOL_RECYCLE'] = DB_POOL_RECYCLE
+    app.config['DB_POOL_PRE_PING'] = DB_POOL_PRE_PING
+    app.config['DB_STATEMENT_TIMEOUT'] = DB_STATEMENT_TIMEOUT
+    app.config['SQLITE_JOURNAL_MODE'] = SQLITE_JOURNAL_MODE
+    app.config['SQLITE_SYNCHRONOUS'] = SQLITE_SYNCHRONOUS
+    app.config['SQLITE_BUSY_TIMEOUT'] = SQLITE_BUSY_TIMEOUT
+    app.config['SQLITE_MMAP_SIZE'] = SQLITE_MMAP_SIZE
+
+    # SQL statement budget per request
+    app.config['QUERY_LIMITS'] = QUERY_LIMITS
+    app.config['QUERY_LIMIT_RAISE'] = QUERY_LIMIT_RAISE
+
+    # Request metrics and slow request profiles
+    app.config['METRICS_ENABLED'] = METRICS_ENABLED
+    app.config['METRICS_TOKEN'] = METRICS_TOKEN
+    app.config['METRICS_BUCKETS'] = METRICS_BUCKETS
+    app.config['SLOW_REQUEST_MS'] = SLOW_REQUEST_MS
+    app.config['SLOW_REQUEST_SAMPLE_INTERVAL'] = SLOW_REQUEST_SAMPLE_INTERVAL
+    app.config['SLOW_REQUEST_PROFILE_DIR'] = SLOW_REQUEST_PROFILE_DIR
+
+    # How often cached permissions and option lists are revalidated
+    app.config['CACHE_VERSION_TTL'] = CACHE_VERSION_TTL
+
+    # Principals of API tokens
+    app.config['API_TOKEN_CACHE_TTL'] = API_TOKEN_CACHE_TTL
+    app.config['API_TOKEN_CACHE_SIZE'] = API_TOKEN_CACHE_SIZE
+
+    # Cached pages of the JSON document list
+    app.config['API_PAGE_CACHE_SIZE'] = API_PAGE_CACHE_SIZE
+    app.config['API_PAGE_CACHE_TTL'] = API_PAGE_CACHE_TTL
+
+    # Multi tag filters and the cached facet counts of the document list
+    app.config['TAG_FILTER_MAX_IDS'] = TAG_FILTER_MAX_IDS
+    app.config['FACET_COUNT_CACHE_SIZE'] = FACET_COUNT_CACHE_SIZE
+    app.config['FACET_COUNT_CACHE_TTL'] = FACET_COUNT_CACHE_TTL
+
+    # Full text search
+    app.config['SEARCH_LANGUAGE'] = SEARCH_LANGUAGE
+
+    if test_config is not None:
+        app.config.update(test_config)
+
+    # Explicit engine options in test_config win
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', database.engine_options(app.config))
     db.init_app(app)
+    database.init_app(app)
+    instrumentation.init_app(app)
+    fragments.init_app(app)
     Migrate(app, db)
 
-    with app.app_context():
-        db.create_all()
+    app.cli.add_command(database.init_db_command)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(storage.files_cli)
+    app.cli.add_command(bills_cli)
+    app.cli.add_command(listing_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(tokens_cli)
 
     login_manager.init_app(app) 
     # Auth 
@@ -59,6 +163,10 @@ def create_app(test_config=None):
     app.register_blueprint(doc_types_blueprint, url_prefix = '/document-types')
     # Tags
     app.register_blueprint(tags_blueprint, url_prefix = '/tags')
+    # JSON API
+    app.register_blueprint(api_blueprint, url_prefix = '/api/v1')
+    # Monthly document counts
+    app.register_blueprint(dashboard_blueprint, url_prefix = '/dashboard')
 
     @app.route('/')
     def redirect_main():
@@ -0,0 +1,253 @@
+from functools import lru_cache, wraps
+
+from flask import Blueprint, abort, current_app, jsonify, request, url_for
+from sqlalchemy import and_, case, or_
+
+from ..cache import TTLCache, VersionedCache
+from ..listing import LISTING_VERSION
+from ..pagination import keyset_paginate
+from ..search import search_scores
+from ..models.models import Bill, File, bill_tag, db
+from ..forms.forms import FilterBillForm
+from .auth import current_user, current_permissions
+from .bills import get_filter_conditions, option_lists
+
+api_blueprint = Blueprint('api', __name__)
+
+# Public name -> column. Rows are selected as plain tuples in this order and
+# serialized with a function built once per field list, no per row reflection.
+BILL_FIELDS = {
+    'id': Bill.id,
+    'folio': Bill.folio,
+    'bill_date': Bill.bill_date,
+    'payment_date': Bill.payment_date,
+    'bill_concept': Bill.bill_concept,
+    'description': Bill.description,
+    'author_id': Bill.author_id,
+    'document_type_id': Bill.document_type_id,
+}
+# Not a column, the tag ids of a page are loaded with one extra query
+BILL_TAGS_FIELD = 'tags'
+BILL_ALL_FIELDS = tuple(BILL_FIELDS) + (BILL_TAGS_FIELD,)
+
+FILE_FIELDS = {
+    'id': File.id,
+    'size': File.size,
+    'checksum': File.checksum,
+    'mime_type': File.mime_type,
+    'page_count': File.page_count,
+}
+
+# Values JSON can not hold as they come from the database
+CONVERTERS = {
+    'bill_date': lambda value: value.isoformat(),
+    'payment_date': lambda value: value.isoformat(),
+}
+
+MAX_PER_PAGE = 100
+
+# Query string -> (body, etag) of a /bills page. Every write to a bill
+# refreshes its bill_listing row, so that version covers the columns read here
+page_cache = VersionedCache('api_bill_pages', lambda: TTLCache(
+    current_app.config['API_PAGE_CACHE_SIZE'], current_app.config['API_PAGE_CACHE_TTL']),
+    version=LISTING_VERSION)
+
+@lru_cache(maxsize=128)
+def row_serializer(names):
+    '''
+    Function turning a result row into a dict of the given names, positional.
+    Trailing columns of the row beyond the names are ignored.
+    '''
+    converters = [(name, CONVERTERS[name]) for name in names if name in CONVERTERS]
+    if not converters:
+        return lambda row: dict(zip(names, row))
+
+    def serialize(row):
+        item = dict(zip(names, row))
+        for name, convert in converters:
+            if item[name] is not None:
+                item[name] = convert(item[name])
+        return item
+    return serialize
+
+def error(status, message):
+    response = jsonify(error=message)
+    response.status_code = status
+    return response
+
+def api_permission_required(permission):
+    # JSON answers instead of the redirects of the HTML views
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_user.is_authenticated:
+                return error(401, 'Authentication required.')
+            if not getattr(current_permissions(), permission):
+                return error(403, 'Permission denied.')
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def requested_fields(available, default):
+    # ?fields=id,folio keeps only those names, in the order they are declared
+    fields = request.args.get('fields')
+    if not fields:
+        return default
+    names = set(fields.split(','))
+    unknown = names.difference(available)
+    if unknown:
+        abort(error(400, f"Unknown fields: {', '.join(sorted(unknown))}."))
+    return tuple(name for name in available if name in names)
+
+def etag_response(payload):
+    # Strong ETag over the body, unchanged resources are answered with 304
+    response = jsonify(payload)
+    response.add_etag()
+    return conditional(response)
+
+def conditional(response):
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def cached_response(cache, key):
+    body, etag = cache.get(key) or (None, None)
+    if body is None:
+        return None
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return conditional(response)
+
+def store_response(cache, key, response):
+    # Only complete 200 answers, 304s have no body
+    if response.status_code == 200:
+        cache.set(key, (response.get_data(), response.get_etag()[0]))
+    return response
+
+def load_bill_tags(bill_ids):
+    tags = {bill_id: [] for bill_id in bill_ids}
+    rows = db.session.execute(
+        db.select(bill_tag.c.bill_id, bill_tag.c.tag_id)
+        .where(bill_tag.c.bill_id.in_(bill_ids))
+        .order_by(bill_tag.c.bill_id, bill_tag.c.tag_id))
+    for bill_id, tag_id in rows:
+        tags[bill_id].append(tag_id)
+    return tags
+
+def serialize_bills(rows, fields):
+    columns = tuple(name for name in fields if name != BILL_TAGS_FIELD)
+    serialize = row_serializer(columns)
+    items = [serialize(row) for row in rows]
+    if BILL_TAGS_FIELD in fields:
+        # The bill id is always the last selected column
+        tags = load_bill_tags([row[-1] for row in rows])
+        for item, row in zip(items, rows):
+            item[BILL_TAGS_FIELD] = tags[row[-1]]
+    return items
+
+@api_blueprint.route('/bills')
+@api_permission_required('can_view_bills')
+def list_bills():
+    '''
+    Same filters as the document list (folio, q, tags, tags_match, author,
+    document_type, date_from, date_to), plus cursor, per_page and fields.
+    tags may be repeated, tags_match is 'all' (default) or 'any'.
+    Pages are served from the per worker page_cache while the listing is
+    unchanged, a hit issues no query.
+    '''
+    cache = page_cache.get() if current_app.config['API_PAGE_CACHE_SIZE'] else None
+    key = request.query_string
+    if cache is not None:
+        response = cached_response(cache, key)
+        if response is not None:
+            return response
+
+    fields = requested_fields(BILL_ALL_FIELDS, BILL_ALL_FIELDS)
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), MAX_PER_PAGE))
+    cursor = request.args.get('cursor')
+
+    filter_form = FilterBillForm(request.args)
+    # The HTML list drops filters it can not parse, clients are told instead
+    invalid = [name for name, field in filter_form._fields.items()
+               if field.process_errors and request.args.get(name)]
+    if invalid:
+        return error(400, f"Invalid values for: {', '.join(invalid)}.")
+    filter = and_(*get_filter_conditions(filter_form).values())
+    # The sort keys and the id follow the requested columns
+    columns = [BILL_FIELDS[name] for name in fields if name != BILL_TAGS_FIELD]
+
+    scores = search_scores(filter_form.q.data)
+    if scores is not None:
+        stmt = (db.select(*columns, scores.c.score, Bill.id)
+                .join(scores, scores.c.bill_id == Bill.id)
+                .where(filter))
+        order_by = [(scores.c.score, False), (Bill.id, False)]
+    else:
+        stmt = db.select(*columns, Bill.folio, Bill.id).where(filter)
+        order_by = [(Bill.folio, True), (Bill.id, True)]
+    page = keyset_paginate(stmt, order_by=order_by, key=lambda row: (row[-2], row[-1]),
+                           per_page=per_page, cursor=cursor, scalars=False)
+
+    response = etag_response({
+        'data': serialize_bills(page.items, fields),
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
+    return store_response(cache, key, response) if cache is not None else response
+
+def file_rows(where):
+    # Files of the three groups of a bill, labelled with the group they belong to
+    group = case(
+        (File.id_group == Bill.bill_pdf_id, 'bill_pdf'),
+        (File.id_group == Bill.client_deposit_image_id, 'client_deposit_image'),
+        else_='deposit_image')
+    return db.session.execute(
+        db.select(*FILE_FIELDS.values(), group, Bill.id)
+        .join(Bill, or_(File.id_group == Bill.bill_pdf_id,
+                        File.id_group == Bill.client_deposit_image_id,
+                        File.id_group == Bill.deposit_image_id))
+        .where(where)
+        .order_by(File.id)).all()
+
+def serialize_files(rows):
+    serialize = row_serializer(tuple(FILE_FIELDS) + ('group', 'bill_id'))
+    items = [serialize(row) for row in rows]
+    for item in items:
+        item['url'] = url_for('bills.download_file', file_id=item['id'])
+    return items
+
+@api_blueprint.route('/bills/<int:bill_id>')
+@api_permission_required('can_view_bills')
+def get_bill(bill_id):
+    fields = tuple(BILL_FIELDS)
+    row = db.session.execute(db.select(*BILL_FIELDS.values()).where(Bill.id == bill_id)).first()
+    if row is None:
+        return error(404, 'Not found.')
+    bill = row_serializer(fields)(row)
+    bill[BILL_TAGS_FIELD] = load_bill_tags([bill_id])[bill_id]
+    bill['files'] = serialize_files(file_rows(Bill.id == bill_id))
+    return etag_response(bill)
+
+@api_blueprint.route('/files/<int:file_id>')
+@api_permission_required('can_view_bills')
+def get_file(file_id):
+    rows = file_rows(File.id == file_id)
+    if not rows:
+        return error(404, 'Not found.')
+    return etag_response(serialize_files(rows)[0])
+
+def option_list(name):
+    # Served from the per worker option cache, no query in steady state
+    options = option_lists.get()
+    active = {id for id, _ in options['active_' + name]}
+    return [{'id': id, 'name': label, 'is_active': id in active} for id, label in options[name]]
+
+@api_blueprint.route('/tags')
+@api_permission_required('can_view_bills')
+def list_tags():
+    return etag_response({'data': option_list('tags')})
+
+@api_blueprint.route('/document-types')
+@api_permission_required('can_view_bills')
+def list_document_types():
+    return etag_response({'data': option_list('document_types')})
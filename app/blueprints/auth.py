@@ -4,7 +4,9 @@ from flask import flash, redirect, url_for, render_template, Blueprint
 from flask_login import login_user, LoginManager, current_user, logout_user, login_required
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from ..models.models import User, Role, db
+from ..cache import VersionedCache, bump_version
+from ..tokens import authenticate
+from ..models.models import User, Role, PermissionSet, PERMISSIONS, db
 from ..forms.forms import RegisterForm, LoginForm
 
 login_manager = LoginManager()
@@ -23,15 +25,47 @@ def unauthorized():
 def load_user(user_id):
     return db.get_or_404(User, user_id)
 
+@login_manager.request_loader
+def load_user_from_token(request):
+    # Only the JSON API accepts tokens: "Authorization: Bearer <token>"
+    if request.blueprint != 'api':
+        return None
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    return authenticate(token.strip())
+
+def load_role_permissions():
+    # Compile the permission flags of every role into a bitmask
+    columns = [getattr(Role, permission) for permission in PERMISSIONS]
+    rows = db.session.execute(db.select(Role.id, *columns)).all()
+    return {row[0]: PermissionSet.from_flags(row[1:]) for row in rows}
+
+role_permissions = VersionedCache('role_permissions', load_role_permissions)
+
+def get_permissions(role_id):
+    if role_id is None:
+        return PermissionSet(0)
+    permissions = role_permissions.get()
+    if role_id not in permissions:
+        # The role may have been created by another worker
+        role_permissions.invalidate()
+        permissions = role_permissions.get()
+    return permissions.get(role_id, PermissionSet(0))
+
+def current_permissions():
+    return get_permissions(getattr(current_user, 'role_id', None))
+
+@auth_blueprint.app_context_processor
+def inject_permissions():
+    return dict(permissions=current_permissions())
+
 def permission_required(permission):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # Get the user's role from the database
-            role = Role.query.filter_by(id=current_user.role_id).first()
-
             # Check if the role has the required permission
-            if not getattr(role, permission):
+            if not getattr(current_permissions(), permission):
                 flash('No tienes permisos para ver esta pagina.')
                 return redirect(url_for('auth.login'))
             return f(*args, **kwargs)
@@ -75,6 +109,7 @@ def register():
             role = user_role
         )
         db.session.add(new_user)
+        bump_version('option_lists')
         db.session.commit()
         login_user(new_user)
         return redirect(url_for('bills.get_all'))
@@ -1,14 +1,29 @@
-from datetime import datetime
 import os
+from datetime import datetime
 
-from flask import Blueprint, render_template, abort, url_for, redirect, flash, request, send_from_directory
+from flask import (Blueprint, render_template, abort, url_for, redirect, flash, request, current_app,
+                   stream_with_context)
 from jinja2 import TemplateNotFound
-from sqlalchemy import and_, or_
+from markupsafe import Markup
+from werkzeug.utils import safe_join
+from sqlalchemy import and_, bindparam, or_
+from sqlalchemy.orm import joinedload, selectinload
 
+from ..cache import TTLCache, VersionedCache, bump_version
 from ..config import APP_ROOT_PATH
-from ..models.models import Bill, File, FileGroup, DocumentType, Tag, User, db
+from ..pagination import keyset_paginate
+from ..search import search_scores, index_bill, unindex_bill
+from ..listing import LISTING_VERSION, has_tag, refresh_listing, unlist_bill
+from ..rollups import RollupDelta, count_bills
+from ..tag_index import tag_index
+from ..storage import store_blob, release_file, send_stored_file
+from ..previews import send_preview
+from ..fragments import fragment_cache
+from ..export import stream_zip, archive_name
+from ..jobs import enqueue
+from ..models.models import Bill, BillListing, File, FileGroup, DocumentType, Tag, User, Job, bill_tag, db
 from ..forms.forms import CreateBillForm, FilterBillForm
-from .auth import login_required, permission_required, current_user
+from .auth import login_required, permission_required, current_user, current_permissions
 
 
 
@@ -18,65 +33,191 @@ bills_blueprint = Blueprint('bills', __name__, template_folder = 'templates')
 def get_id_name_pair(option_class):
     return [(option.id, option.name) for option in option_class]
 
-def make_filename(file: File, index: int):
-    # Create filenames based of the original name and the current 
-    file_extension = os.path.splitext(file.filename)[1]
-    file_name = str(datetime.now()).replace(" ", "_").replace(":",".")
-    filename = f'{index}{file_name}{current_user.id}{file_extension}'
-    return filename
+def load_option_lists():
+    # Only the columns the dropdowns need, inactive rows are kept for the filters
+    tags = db.session.execute(db.select(Tag.id, Tag.name, Tag.is_active)).all()
+    document_types = db.session.execute(
+        db.select(DocumentType.id, DocumentType.name, DocumentType.is_active)).all()
+    users = db.session.execute(db.select(User.id, User.name)).all()
+    return {
+        'tags': get_id_name_pair(tags),
+        'active_tags': get_id_name_pair(tag for tag in tags if tag.is_active),
+        'document_types': get_id_name_pair(document_types),
+        'active_document_types': get_id_name_pair(type for type in document_types if type.is_active),
+        'users': get_id_name_pair(users),
+    }
+
+# (id, name) choices shared by the filter and create forms, the version is bumped
+# whenever tags, document types or users change
+option_lists = VersionedCache('option_lists', load_option_lists)
 
 def save_files_into_file_group(files: list) -> FileGroup:
-    file_paths = [os.path.join(
-                    'files/', 
-                    make_filename(file, i)) 
-                    for i, file in enumerate(files)]
-    
-    # Save all the files 
-    for i in range(len(files)):
-        files[i].save(os.path.join(APP_ROOT_PATH, file_paths[i]))
-
     file_group = FileGroup()
-    # Store file paths in the database
-    for path in file_paths:
+    for file in files:
+        # Identical content is stored once, the blob is hashed while streamed in
+        # and removed again if the transaction does not commit
+        blob = store_blob(file)
+
+        # Store file paths in the database
         new_file = File(
-            file_url = path,
+            file_url = blob.file_url,
+            checksum = blob.checksum,
+            size = blob.size,
+            blob = blob,
             file_group = file_group  
         )
         db.session.add(new_file) 
 
     return file_group
 
-def get_filter(filter_form : FilterBillForm):
+def selected_id(value):
+    # The selects send 0 (or nothing) for every option
+    return value if value and value > 0 else None
+
+def get_filter_conditions(filter_form : FilterBillForm, source=Bill):
+    # source is Bill or BillListing, both have the filtered columns
     folio = filter_form.folio.data
-    tag_id = filter_form.tags.data
-    author_id = filter_form.author.data
-    document_type_id = filter_form.document_type.data
+    tag_ids = [tag_id for tag_id in filter_form.tags.data or [] if tag_id > 0]
+    match_all = filter_form.tags_match.data != 'any'
+    author_id = selected_id(filter_form.author.data)
+    document_type_id = selected_id(filter_form.document_type.data)
 
-    condition_folio = Bill.folio.like(f'{folio}%') if folio != None else True
+    condition_folio = source.folio.like(f'{folio}%') if folio != None else True
 
-    condition_author = Bill.author_id==author_id if (
-        author_id != None and  int(author_id) > 0
-        ) else True
+    condition_author = source.author_id==author_id if author_id != None else True
     
-    condition_type = Bill.document_type_id==document_type_id if (
-        document_type_id != None and int(document_type_id) > 0
-        ) else True
+    condition_type = source.document_type_id==document_type_id if document_type_id != None else True
     
-    condition_tag = Bill.tags.any(id = tag_id) if (
-        tag_id != None and int(tag_id) > 0
-        ) else True
+    condition_tag = get_tag_condition(tag_ids, match_all, source) if tag_ids else True
+
+    # Empty or malformed dates leave the data as None
+    date_from = filter_form.date_from.data
+    date_to = filter_form.date_to.data
+    condition_date = and_(
+        source.bill_date >= date_from if date_from != None else True,
+        source.bill_date <= date_to if date_to != None else True
+    )
 
-    filter = and_(condition_type, condition_author, condition_folio, condition_tag)
+    # Keyed by facet so the counts can leave out the facet being counted
+    return {
+        'folio': condition_folio,
+        'author': condition_author,
+        'document_type': condition_type,
+        'tag': condition_tag,
+        'date': condition_date,
+    }
+
+def get_tag_condition(tag_ids: list, match_all: bool, source=Bill):
+    '''
+    Bills carrying all (or any) of the tags. The ids are looked up in the
+    per worker tag index and sent as one IN list; matches larger than
+    TAG_FILTER_MAX_IDS are filtered by the database tag by tag instead.
+    '''
+    index = tag_index.get()
+    bill_ids = index.all_of(tag_ids) if match_all else index.any_of(tag_ids)
+    if len(bill_ids) <= current_app.config['TAG_FILTER_MAX_IDS']:
+        # Integers rendered into the statement, no bound parameter per id
+        return source.id.in_(bindparam('tag_bill_ids', bill_ids, expanding=True, literal_execute=True))
+
+    # The listing keeps the tags of a bill packed in one column
+    conditions = [has_tag(tag_id) if source is BillListing else Bill.tags.any(id = tag_id)
+                  for tag_id in tag_ids]
+    return and_(*conditions) if match_all else or_(*conditions)
+
+def get_filter(filter_form : FilterBillForm):
+    conditions = get_filter_conditions(filter_form)
+
+    filter = and_(*conditions.values())
 
     return filter
 
+def get_facet_counts(conditions: dict, scores=None) -> dict:
+    '''Number of matching bills per tag, document type and author in one query.
+
+    Each facet is counted with every filter except its own, so the options show
+    how many documents the user gets by switching to them. The conditions are
+    the BillListing ones.
+    '''
+    def facet_select(name, column, *joins):
+        stmt = db.select(db.literal(name).label('facet'), column.label('value'), db.func.count().label('total'))
+        stmt = stmt.select_from(BillListing)
+        for target, onclause in joins:
+            stmt = stmt.join(target, onclause)
+        if scores is not None:
+            stmt = stmt.join(scores, scores.c.bill_id == BillListing.id)
+        others = [condition for key, condition in conditions.items() if key != name]
+        return stmt.where(and_(*others)).group_by(column)
+
+    union = db.union_all(
+        facet_select('tag', bill_tag.c.tag_id, (bill_tag, bill_tag.c.bill_id == BillListing.id)),
+        facet_select('document_type', BillListing.document_type_id),
+        facet_select('author', BillListing.author_id),
+    )
+    counts = {'tag': {}, 'document_type': {}, 'author': {}}
+    for facet, value, total in db.session.execute(union):
+        counts[facet][value] = total
+    return counts
+
+# Filter key -> facet counts, see facet_cache_key
+facet_count_cache = VersionedCache('facet_counts', lambda: TTLCache(
+    current_app.config['FACET_COUNT_CACHE_SIZE'], current_app.config['FACET_COUNT_CACHE_TTL']),
+    version=LISTING_VERSION)
+
+def facet_cache_key(filter_form: FilterBillForm):
+    '''
+    Key of the cached counts for the unfiltered list and for lists narrowed
+    by a single facet, the views everybody lands on. None for searches and
+    combined filters, which are counted by the database on every request.
+    '''
+    form = filter_form
+    if form.q.data or form.folio.data or form.date_from.data or form.date_to.data:
+        return None
+    tag_ids = tuple(sorted({tag_id for tag_id in form.tags.data or [] if tag_id > 0}))
+    facets = (
+        ('author', selected_id(form.author.data)),
+        ('document_type', selected_id(form.document_type.data)),
+        ('tag', (tag_ids, form.tags_match.data != 'any') if tag_ids else None),
+    )
+    active = [(name, value) for name, value in facets if value is not None]
+    if len(active) > 1:
+        return None
+    return tuple(active)
+
+def cached_facet_counts(filter_form: FilterBillForm, conditions: dict) -> dict:
+    key = facet_cache_key(filter_form)
+    if key is None:
+        return get_facet_counts(conditions)
+    cache = facet_count_cache.get()
+    counts = cache.get(key)
+    if counts is None:
+        counts = get_facet_counts(conditions)
+        cache.set(key, counts)
+    return counts
+
+def with_counts(choices: list, counts: dict) -> list:
+    # New lists, the cached choices are shared between requests
+    return [(id, f'{name} ({counts.get(id, 0)})') for id, name in choices]
+
 @bills_blueprint.route('/download/<int:file_id>')
 @login_required
 def download_file(file_id):
-    root_path = APP_ROOT_PATH
-    filename = db.get_or_404(File, file_id)
+    file = db.get_or_404(File, file_id)
     
-    return send_from_directory(root_path, filename.file_url)
+    # Conditional and ranged responses, optionally offloaded to the web server
+    return send_stored_file(file)
+
+@bills_blueprint.route('/preview/<int:file_id>/<int:width>')
+@login_required
+def preview_file(file_id, width):
+    if width not in current_app.config['PREVIEW_WIDTHS']:
+        abort(404)
+    file = db.get_or_404(File, file_id)
+
+    response = send_preview(file, width)
+    if response is None:
+        # Not an image or Pillow is not installed
+        return redirect(url_for('bills.download_file', file_id=file_id))
+    return response
 
 @bills_blueprint.route('/')
 @login_required
@@ -84,33 +225,131 @@ def download_file(file_id):
 def get_all():
     filter_form = FilterBillForm(request.args)
 
-    document_types = db.session.execute(db.select(DocumentType)).scalars().all()
-    tags = db.session.execute(db.select(Tag)).scalars().all()
-    users = db.session.execute(db.select(User)).scalars().all()
-    
-    # Transform tags and document_types to tuple lists to send as options to the form 
-    # based of the database registers
-    filter_form.tags.choices = get_id_name_pair(tags)
-    filter_form.document_type.choices = get_id_name_pair(document_types)
-    filter_form.author.choices = get_id_name_pair(users)
+    # Options for the form come from the per worker cache of the database registers
+    options = option_lists.get()
+    filter_form.tags.choices = options['tags']
+    filter_form.document_type.choices = options['document_types']
+    filter_form.author.choices = options['users']
     
-    # Get filter for the query
-    filter = get_filter(filter_form)
+    # Everything the page shows and filters on is read from the bill_listing
+    # projection, no joins to users, document types or tags
+    conditions = get_filter_conditions(filter_form, BillListing)
+    filter = and_(*conditions.values())
 
-    page = request.args.get('page', 1, type=int)
     per_page = 10
 
-    bills = Bill.query.filter(filter).order_by(Bill.folio.desc()).paginate(page=page, per_page=per_page, error_out=False)
-    # bills = Bill.query.order_by(Bill.folio.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    cursor = request.args.get('cursor')
+    count = request.args.get('count', 0, type=int) == 1
+
+    scores = search_scores(filter_form.q.data)
+    if scores is not None:
+        # Ranked search mode, best matches first
+        stmt = (db.select(BillListing, scores.c.score)
+                .join(scores, scores.c.bill_id == BillListing.id)
+                .where(filter))
+        bills = keyset_paginate(
+            stmt,
+            order_by=[(scores.c.score, False), (BillListing.id, False)],
+            key=lambda row: (row.score, row.BillListing.id),
+            per_page=per_page, cursor=cursor, count=count, scalars=False
+        )
+        bills.items = [row.BillListing for row in bills.items]
+    else:
+        # Seek pagination ordered by (folio, id), deep pages cost the same as the first one
+        stmt = db.select(BillListing).where(filter)
+        bills = keyset_paginate(
+            stmt,
+            order_by=[(BillListing.folio, True), (BillListing.id, True)],
+            key=lambda bill: (bill.folio, bill.id),
+            per_page=per_page, cursor=cursor, count=count
+        )
 
-    return render_template("index.html", all_posts=bills, filter_form = filter_form)
+    # Matching documents per option, one grouped query for the three facets.
+    # Searches are never cached, the common filters are
+    if scores is not None:
+        facets = get_facet_counts(conditions, scores)
+    else:
+        facets = cached_facet_counts(filter_form, conditions)
+    filter_form.tags.choices = with_counts(options['tags'], facets['tag'])
+    filter_form.document_type.choices = with_counts(options['document_types'], facets['document_type'])
+    filter_form.author.choices = with_counts(options['users'], facets['author'])
+
+    # Current filters are kept on the pagination links
+    page_args = {key: values for key, values in request.args.lists() if key != 'cursor'}
+
+    return render_template("index.html", all_posts=bills, filter_form = filter_form, page_args = page_args)
+
+def export_rows(filter):
+    '''(folio, group, file id, file url) of every attachment of the matching bills, by folio'''
+    def group_select(name, group_id):
+        return (db.select(Bill.folio, Bill.id.label('bill_id'), db.literal(name).label('file_group'),
+                          File.id.label('file_id'), File.file_url)
+                .join(File, File.id_group == group_id)
+                .where(filter))
+
+    rows = db.union_all(
+        group_select('factura', Bill.bill_pdf_id),
+        group_select('deposito_cliente', Bill.client_deposit_image_id),
+        group_select('deposito', Bill.deposit_image_id),
+    ).subquery()
+    stmt = (db.select(rows.c.folio, rows.c.file_group, rows.c.file_id, rows.c.file_url)
+            .order_by(rows.c.folio, rows.c.bill_id, rows.c.file_group, rows.c.file_id)
+            .execution_options(yield_per=500))
+    # Rows are fetched from the cursor in batches while the archive is written
+    return db.session.execute(stmt)
+
+@bills_blueprint.route('/export')
+@login_required
+@permission_required('can_view_bills')
+def export():
+    filter_form = FilterBillForm(request.args)
+    filter = and_(*get_filter_conditions(filter_form).values())
+    scores = search_scores(filter_form.q.data)
+    if scores is not None:
+        filter = and_(filter, Bill.id.in_(db.select(scores.c.bill_id)))
+
+    def entries():
+        for folio, group, file_id, file_url in export_rows(filter):
+            path = safe_join(APP_ROOT_PATH, file_url)
+            if path is None or not os.path.isfile(path):
+                current_app.logger.warning('Export skipped missing file %s', file_url)
+                continue
+            yield archive_name(folio, group, file_id, file_url), path
+
+    chunks = stream_zip(entries(), current_app.config['UPLOAD_CHUNK_SIZE'])
+    # The request context, and the database session, stay open until the last chunk
+    return current_app.response_class(stream_with_context(chunks), mimetype='application/zip', headers={
+        'Content-Disposition': 'attachment; filename=documentos.zip',
+        'Cache-Control': 'private, no-store',
+    })
 
 @bills_blueprint.route("/<int:bill_id>", methods=["GET", "POST"])
 @login_required
 @permission_required('can_view_bills')
 def show(bill_id):
-    requested_bill = db.get_or_404(Bill, bill_id)
-    return render_template("post.html", post=requested_bill)
+    version = db.session.execute(db.select(Bill.version).where(Bill.id == bill_id)).scalar()
+    if version is None:
+        abort(404)
+
+    # The rendered body only changes with the bill version and what the role may see
+    mask = int(current_permissions())
+    cache = fragment_cache()
+    body = cache.get(bill_id, version, mask)
+    if body is None:
+        # Load every relationship post_body.html walks in a fixed number of queries
+        requested_bill = db.get_or_404(Bill, bill_id, options=[
+            joinedload(Bill.document_type),
+            joinedload(Bill.bill_pdf).joinedload(FileGroup.files),
+            joinedload(Bill.client_deposit_image).joinedload(FileGroup.files),
+            joinedload(Bill.deposit_image).joinedload(FileGroup.files),
+            selectinload(Bill.tags),
+        ])
+        body = render_template("post_body.html", post=requested_bill)
+        cache.set(bill_id, requested_bill.version, mask, body)
+
+    jobs = db.session.execute(
+        db.select(Job.kind, Job.status).where(Job.bill_id == bill_id).order_by(Job.id)).all()
+    return render_template("post.html", body=Markup(body), jobs=jobs)
 
 
 @bills_blueprint.route("/create", methods=["GET", "POST"])
@@ -119,14 +358,11 @@ def show(bill_id):
 def add_new_bill():
     form = CreateBillForm()
     
-    document_types = db.session.execute(db.select(DocumentType).where(DocumentType.is_active)).scalars().all()
-    tags = db.session.execute(db.select(Tag).where(Tag.is_active)).scalars().all()
-    
-    # Transform tags and document_types to tuple lists to send as options to the form 
-    # based of the database registers
+    # Options for the form come from the per worker cache of the database registers
     # form.document_type.choices = [('option_id_1', 'option_name_1'), ('option_id_2', 'option_name_2')]
-    form.tags.choices = get_id_name_pair(tags)
-    form.document_type.choices = get_id_name_pair(document_types)
+    options = option_lists.get()
+    form.tags.choices = options['active_tags']
+    form.document_type.choices = options['active_document_types']
 
     if form.validate_on_submit():
         # The multiple file field returns a list of files 
@@ -160,7 +396,20 @@ def add_new_bill():
         for tag_id in form.tags.data:
             tag_selected = db.get_or_404(Tag, tag_id)
             new_bill.tags.append(tag_selected)
-
+        if form.tags.data:
+            bump_version('bill_tags')
+
+        # The bill id is needed by the search index
+        db.session.flush()
+        index_bill(new_bill)
+        refresh_listing([new_bill.id])
+        count_bills([new_bill])
+
+        # Per file processing runs in the background workers, the jobs 
+        # become visible to them when the bill is committed
+        for file_group in (bill_file_group, client_images_group, deposit_images_group):
+            for file in file_group.files:
+                enqueue('inspect_file', bill_id=new_bill.id, file_id=file.id)
         db.session.commit()
 
         return redirect(url_for("bills.get_all"))
@@ -179,39 +428,39 @@ def edit(bill_id):
         bill_concept = bill.bill_concept,
         description = bill.description
     )
+    options = option_lists.get()
+    edit_form.tags.choices = options['active_tags']
+    edit_form.document_type.choices = options['active_document_types']
 
     if edit_form.validate_on_submit():
-        bill.document_type = edit_form.document_type.data
+        # The bill leaves its old monthly counts and joins the new ones,
+        # nothing is written when the month, type and author stay the same
+        rollup = RollupDelta()
+        rollup.add_bill(bill, -1)
+        bill.document_type = db.get_or_404(DocumentType, edit_form.document_type.data)
         bill.payment_date = edit_form.payment_date.data
         bill.bill_date = edit_form.bill_date.data
         bill.bill_concept = edit_form.bill_concept.data
         bill.description = edit_form.description.data
+        # Always an UPDATE, so the version moves even if no column changed
+        bill.updated_at = datetime.utcnow()
+        index_bill(bill)
+        refresh_listing([bill.id])
+        rollup.add_bill(bill)
+        rollup.apply()
         db.session.commit()
-        return redirect(url_for("show_post", bill_id=bill.id))
+        fragment_cache().invalidate(bill.id)
+        return redirect(url_for("bills.show", bill_id=bill.id))
     return render_template("make-post.html", form=edit_form, is_edit=True)
 
 def delete_files_groups(file_group):
-    files = file_group.files
-    # Deleting file_group from the db
+    # The bill referencing the group must be flushed away first
+    for file in list(file_group.files):
+        # Deleting file from the db, the stored content is tombstoned
+        # and unlinked by the reaper once this transaction commits
+        release_file(file)
+    # Deleting file_group from the db, after the files pointing at it
     db.session.delete(file_group)
-
-    for file in files:
-        # Deleting file from the db
-        db.session.delete(file)
-        file_full_path = os.path.join(APP_ROOT_PATH, file.file_url)
-
-        # Check if the file exists, then delete it
-        if os.path.exists(file_full_path):
-
-            print('File deleted at: ')
-            print(file_full_path)
-
-            # Deleting from the directory
-            os.remove(file_full_path)
-        else:
-            print("The file does not exist")
-
-    db.session.commit()
     
 @bills_blueprint.route("/delete/<int:bill_id>")
 @login_required
@@ -219,13 +468,26 @@ def delete_files_groups(file_group):
 def delete_bill(bill_id):
 
     bill_to_delete = db.get_or_404(Bill, bill_id)
-
-    delete_files_groups(bill_to_delete.bill_pdf)
-    delete_files_groups(bill_to_delete.client_deposit_image)
-    delete_files_groups(bill_to_delete.deposit_image)
-    
+    file_groups = [bill_to_delete.bill_pdf, bill_to_delete.client_deposit_image,
+                   bill_to_delete.deposit_image]
+
+    unindex_bill(bill_to_delete.id)
+    unlist_bill(bill_to_delete.id)
+    count_bills([bill_to_delete], -1)
+    if bill_to_delete.tags:
+        bump_version('bill_tags')
     db.session.delete(bill_to_delete)
+    # The bill references its file groups, it has to go before them
+    db.session.flush()
+
+    for file_group in file_groups:
+        if file_group is not None:
+            delete_files_groups(file_group)
+
+    # Everything above is a single transaction, disk cleanup happens in the background
+    enqueue('reap_files')
     db.session.commit()
+    fragment_cache().invalidate(bill_id)
     return redirect(url_for('bills.get_all'))
 
 
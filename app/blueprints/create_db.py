@@ -6,6 +6,7 @@ import app
 from ..forms.forms import FillDatabaseForm
 from ..models.models import Role, User, test_db_integrity
 from ..extensions import db
+from ..cache import bump_version
 
 
 db_blueprint = Blueprint('db', __name__, template_folder = 'templates')
@@ -17,6 +18,8 @@ def create_db():
         return redirect(url_for('auth.login'))
     
     if form.validate_on_submit():
+        # First run against an empty database, the tables may not exist yet
+        db.create_all()
 
         new_role = Role(
             role_title = 'admin',
@@ -50,6 +53,8 @@ def create_db():
             role = new_role
         )
         db.session.add(new_user)
+        bump_version('option_lists')
+        bump_version('role_permissions')
         db.session.commit()
         return redirect(url_for('auth.login'))
 
@@ -0,0 +1,61 @@
+import datetime
+
+from flask import Blueprint, render_template, request
+from sqlalchemy import and_, func
+
+from ..models.models import BillMonthlyCount, BillMonthlyTagCount, db
+from .auth import login_required, permission_required
+from .bills import option_lists
+
+dashboard_blueprint = Blueprint('dashboard', __name__, template_folder = 'templates')
+
+MONTHS = ('Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio',
+          'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre')
+
+def totals_by(column, *where):
+    # Totals of one year of the rollup grouped by column, largest first.
+    # The rollup holds at most one row per month and key, the bills are never read
+    table = column.table
+    return db.session.execute(
+        db.select(column, func.sum(table.c.total).label('total'))
+        .where(*where)
+        .group_by(column)
+        .having(func.sum(table.c.total) > 0)
+        .order_by(func.sum(table.c.total).desc(), column)).all()
+
+def with_names(rows, names, missing):
+    return [(names.get(id, missing), total) for id, total in rows]
+
+@dashboard_blueprint.route('/')
+@login_required
+@permission_required('can_view_bills')
+def show():
+    counts = BillMonthlyCount.__table__
+    tag_counts = BillMonthlyTagCount.__table__
+
+    first, last = db.session.execute(
+        db.select(func.min(counts.c.month), func.max(counts.c.month)).where(counts.c.total > 0)).one()
+    years = list(range(last.year, first.year - 1, -1)) if first else []
+    default_year = years[0] if years else datetime.date.today().year
+    year = request.args.get('year', default_year, type=int)
+    if not datetime.MINYEAR <= year <= datetime.MAXYEAR:
+        # Dates can not be built for it, show the default year instead
+        year = default_year
+    in_year = lambda table: and_(table.c.month >= datetime.date(year, 1, 1),
+                                 table.c.month <= datetime.date(year, 12, 1))
+
+    by_month = dict(totals_by(counts.c.month, in_year(counts)))
+    months = [(MONTHS[month - 1], by_month.get(datetime.date(year, month, 1), 0)) for month in range(1, 13)]
+
+    # Names come from the per worker option cache
+    options = option_lists.get()
+    by_type = with_names(totals_by(counts.c.document_type_id, in_year(counts)),
+                         dict(options['document_types']), 'Sin tipo')
+    by_author = with_names(totals_by(counts.c.author_id, in_year(counts)),
+                           dict(options['users']), 'Sin autor')
+    by_tag = with_names(totals_by(tag_counts.c.tag_id, in_year(tag_counts)),
+                        dict(options['tags']), 'Etiqueta eliminada')
+
+    return render_template('dashboard.html', year=year, years=years, months=months,
+                           total=sum(total for _, total in months),
+                           by_type=by_type, by_author=by_author, by_tag=by_tag)
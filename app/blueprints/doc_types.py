@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, abort, url_for, redirect, flash, request, send_from_directory
 from jinja2 import TemplateNotFound
 
+from ..cache import bump_version
 from ..models.models import DocumentType, db
 from ..forms.forms import  DocumentTypeForm
 from .auth import login_required, permission_required
@@ -17,6 +18,7 @@ def get_post_document_types():
         new_tag = DocumentType( name = form.name.data )
 
         db.session.add(new_tag)
+        bump_version('option_lists')
         db.session.commit()
 
     result = db.session.execute(db.select(DocumentType).where(DocumentType.is_active))
@@ -34,5 +36,6 @@ def delete_document_type(type_id):
     # db.session.delete(tag_to_delete)
     # Manage soft deletion
     type_to_delete.is_active = False
+    bump_version('option_lists')
     db.session.commit()
     return redirect(url_for('doc_types.get_post_document_types'))
\ No newline at end of file
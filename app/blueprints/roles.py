@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, abort, url_for, redirect, flash
 from jinja2 import TemplateNotFound
 from sqlalchemy import and_
 
+from ..cache import bump_version
 from ..models.models import Role, db
 from ..forms.forms import CreateRoleForm
 from .auth import login_required, permission_required
@@ -26,6 +27,7 @@ def delete_role(role_id):
     # Make a soft deletion
     role_to_delete.is_active = False
     # db.session.delete(role_to_delete)
+    bump_version('role_permissions')
     db.session.commit()
     return redirect(url_for('roles.roles_panel'))
 
@@ -63,6 +65,7 @@ def create_role():
             is_active = True
         )
         db.session.add(new_role)
+        bump_version('role_permissions')
         db.session.commit()
         
         return redirect(url_for('roles.roles_panel'))
@@ -123,6 +126,7 @@ def edit_role(role_id):
         role.can_create_roles = edit_role_form.can_create_roles.data
         role.can_manage_document_types = edit_role_form.can_manage_document_types.data
         
+        bump_version('role_permissions')
         db.session.commit()
         return redirect(url_for("roles.roles_panel"))
     return render_template("register-role.html", form = edit_role_form)
\ No newline at end of file
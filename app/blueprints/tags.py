@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, abort, url_for, redirect, flash, request, send_from_directory
 from jinja2 import TemplateNotFound
 
+from ..cache import bump_version
 from ..models.models import Tag, db
 from ..forms.forms import  TagForm
 from .auth import login_required, permission_required
@@ -18,6 +19,7 @@ def get_post_tag():
         new_tag = Tag( name = form.name.data, is_active = True )
     
         db.session.add(new_tag)
+        bump_version('option_lists')
         db.session.commit()
 
     result = db.session.execute(db.select(Tag).where(Tag.is_active!=False))
@@ -31,5 +33,6 @@ def delete(tag_id):
     tag_to_delete = db.get_or_404(Tag, tag_id)
     tag_to_delete.is_active = False
     # db.session.delete(tag_to_delete)
+    bump_version('option_lists')
     db.session.commit()
     return redirect(url_for('tags.get_post_tag'))
\ No newline at end of file
@@ -3,6 +3,9 @@ from jinja2 import TemplateNotFound
 from werkzeug.security import generate_password_hash
 
 from .auth import login_required, permission_required
+from ..cache import bump_version
+from ..listing import rename_author, unlist_author
+from ..rollups import reassign_author
 from ..models.models import User, Role, db
 from ..forms.forms import RegisterForm
 
@@ -24,6 +27,9 @@ def changue_role(user_id):
         role_selected = request.form.get('user_role')
         
         user.role = db.get_or_404(Role, role_selected)
+        bump_version('role_permissions')
+        # Cached token principals carry the role
+        bump_version('api_tokens')
         db.session.commit()
         return redirect(url_for('users.users_panel'))
     
@@ -52,6 +58,8 @@ def edit_user(user_id):
         user.email = edit_form.email.data
         
         user.password = generate_password_hash(password=edit_form.password.data, method='pbkdf2:sha256', salt_length=8) 
+        rename_author(user.id, user.name)
+        bump_version('option_lists')
         db.session.commit()
         return redirect(url_for("users.users_panel"))
     return render_template("register.html", form=edit_form)
@@ -62,6 +70,10 @@ def edit_user(user_id):
 def delete_user(user_id):
     user_to_delete = db.get_or_404(User, user_id)
     db.session.delete(user_to_delete)
+    unlist_author(user_id)
+    reassign_author(user_id)
+    bump_version('option_lists')
+    bump_version('api_tokens')
     db.session.commit()
     flash('User removed')
     return redirect(url_for('users.users_panel'))
\ No newline at end of file
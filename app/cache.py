@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import update
+
+from .database import UPSERTS
+from .extensions import db
+from .models.models import CacheVersion
+
+
+def read_version(name):
+    version = db.session.execute(
+        db.select(CacheVersion.version).where(CacheVersion.name == name)).scalar()
+    return version or 0
+
+def bump_version(name):
+    # Runs inside the current transaction, other workers see the new
+    # version once the caller commits. The first bump of a name creates its
+    # row, concurrent first bumps meet in the ON CONFLICT clause
+    upsert = UPSERTS.get(db.engine.dialect.name)
+    if upsert is not None:
+        stmt = upsert(CacheVersion).values(name=name, version=1)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[CacheVersion.name], set_={'version': CacheVersion.version + 1}))
+    else:
+        result = db.session.execute(
+            update(CacheVersion)
+            .where(CacheVersion.name == name)
+            .values(version=CacheVersion.version + 1))
+        if not result.rowcount:
+            db.session.add(CacheVersion(name=name, version=1))
+    # Drop the local copies right away
+    states = current_app.extensions.get('versioned_cache', {})
+    for key in [key for key, state in states.items() if state[0] == name]:
+        del states[key]
+
+class VersionedCache:
+    '''
+    Per-worker cache of a value loaded from the database.
+    The value is reloaded when the counter stored in cache_versions under
+    `version` (defaults to `name`) changes, several caches may follow the
+    same counter. The counter is polled at most once every 
+    CACHE_VERSION_TTL seconds, so steady state reads cost no queries.
+    '''
+    def __init__(self, name, loader, version=None):
+        self.name = name
+        self.loader = loader
+        self.version = version or name
+
+    def _states(self):
+        return current_app.extensions.setdefault('versioned_cache', {})
+
+    def get(self):
+        states = self._states()
+        now = time.monotonic()
+        state = states.get(self.name)
+        if state is not None and now - state[3] < current_app.config['CACHE_VERSION_TTL']:
+            return state[2]
+
+        version = read_version(self.version)
+        if state is not None and state[1] == version:
+            value = state[2]
+        else:
+            value = self.loader()
+        states[self.name] = (self.version, version, value, now)
+        return value
+
+    def invalidate(self):
+        self._states().pop(self.name, None)
+
+
+class TTLCache:
+    '''
+    Bounded per-worker mapping whose entries expire `ttl` seconds after
+    they were stored. The least recently used entry goes first when more
+    than `max_entries` are held.
+    '''
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None else None
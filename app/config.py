@@ -4,4 +4,105 @@ SECRET_KEY = os.environ.get('FLASK_KEY', 'super-secret-key')
 DB_URL = os.environ.get("DB_URI", "sqlite:///posts.db")
 UPLOAD_DESTINATION = 'files/'
 
+# Connection pool, size it to the threads of one worker process. Pool options
+# are ignored for SQLite, which keeps SQLAlchemy's defaults.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+# Seconds after which a connection is replaced, below the server idle timeout
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+# Milliseconds a single statement may run on Postgres, 0 for no limit
+DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 0))
+
+# Pragmas set on every SQLite connection. WAL lets readers run while one
+# writer commits and busy_timeout makes writers wait instead of failing with
+# 'database is locked'. An empty value leaves the SQLite default.
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
 APP_ROOT_PATH = os.getcwd() 
+
+# Maximum number of SQL statements an endpoint may issue per request.
+# Exceeding it logs a warning, or raises when testing / QUERY_LIMIT_RAISE is set
+QUERY_LIMITS = {
+    'bills.get_all': int(os.environ.get('QUERY_LIMIT_BILLS_LIST', 10)),
+    'bills.show': int(os.environ.get('QUERY_LIMIT_BILLS_SHOW', 5)),
+    'api.list_bills': int(os.environ.get('QUERY_LIMIT_API_BILLS', 5)),
+}
+QUERY_LIMIT_RAISE = os.environ.get('QUERY_LIMIT_RAISE', '0') == '1'
+
+# Per worker request metrics served at /metrics in the Prometheus text format.
+# Off by default; /metrics answers 404 until METRICS_TOKEN is set and scrapers
+# must send it as a bearer token
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Requests slower than SLOW_REQUEST_MS get a sampled profile written to
+# SLOW_REQUEST_PROFILE_DIR, 0 turns the sampler off
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 0))
+SLOW_REQUEST_SAMPLE_INTERVAL = float(os.environ.get('SLOW_REQUEST_SAMPLE_INTERVAL', 0.005))
+SLOW_REQUEST_PROFILE_DIR = os.environ.get('SLOW_REQUEST_PROFILE_DIR', os.path.join(APP_ROOT_PATH, 'profiles'))
+
+# Seconds a worker trusts its cached data before checking cache_versions again
+CACHE_VERSION_TTL = float(os.environ.get('CACHE_VERSION_TTL', 5))
+
+# JSON API tokens. Authenticated tokens are cached per worker for
+# API_TOKEN_CACHE_TTL seconds, at most API_TOKEN_CACHE_SIZE of them
+API_TOKEN_CACHE_TTL = float(os.environ.get('API_TOKEN_CACHE_TTL', 60))
+API_TOKEN_CACHE_SIZE = int(os.environ.get('API_TOKEN_CACHE_SIZE', 1024))
+
+# Facet counts of the document list, unfiltered or narrowed by one facet, are
+# cached per worker until bill_listing changes. At most FACET_COUNT_CACHE_SIZE
+# filters are kept, each for FACET_COUNT_CACHE_TTL seconds
+FACET_COUNT_CACHE_SIZE = int(os.environ.get('FACET_COUNT_CACHE_SIZE', 256))
+FACET_COUNT_CACHE_TTL = float(os.environ.get('FACET_COUNT_CACHE_TTL', 300))
+
+# Pages of /api/v1/bills are cached per worker by query string until
+# bill_listing changes, at most API_PAGE_CACHE_SIZE of them for
+# API_PAGE_CACHE_TTL seconds each. 0 turns the cache off
+API_PAGE_CACHE_SIZE = int(os.environ.get('API_PAGE_CACHE_SIZE', 1024))
+API_PAGE_CACHE_TTL = float(os.environ.get('API_PAGE_CACHE_TTL', 60))
+
+# Tag filters matching more bills than this are not sent to the database as
+# an id list from the tag index, the packed tag ids are matched instead
+TAG_FILTER_MAX_IDS = int(os.environ.get('TAG_FILTER_MAX_IDS', 20000))
+
+# Full text search
+SEARCH_LANGUAGE = os.environ.get('SEARCH_LANGUAGE', 'spanish')
+
+# Upload limits in bytes, MAX_CONTENT_LENGTH caps the whole request
+MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 100 * 1024 * 1024))
+MAX_FILE_SIZE = int(os.environ.get('MAX_FILE_SIZE', 25 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+
+# Downloads. FILE_OFFLOAD may be 'x-accel' (nginx) or 'x-sendfile' (Apache, 
+# lighttpd) to let the front server send the bytes after the permission check.
+# With x-accel, FILE_OFFLOAD_PREFIX is the internal nginx location mapped to APP_ROOT_PATH.
+FILE_OFFLOAD_MODES = ('x-accel', 'x-sendfile')
+FILE_OFFLOAD = os.environ.get('FILE_OFFLOAD', '')
+if FILE_OFFLOAD and FILE_OFFLOAD not in FILE_OFFLOAD_MODES:
+    # A typo would otherwise send X-Sendfile headers to a server that ignores them
+    raise ValueError(f"FILE_OFFLOAD must be one of {', '.join(FILE_OFFLOAD_MODES)} or empty, not {FILE_OFFLOAD!r}")
+FILE_OFFLOAD_PREFIX = os.environ.get('FILE_OFFLOAD_PREFIX', '/protected-files/')
+FILE_MAX_AGE = int(os.environ.get('FILE_MAX_AGE', 3600))
+
+# Background jobs, a running job older than JOB_TIMEOUT seconds is requeued
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 600))
+
+# Tombstoned files unlinked per transaction by the reaper
+FILE_REAP_BATCH_SIZE = int(os.environ.get('FILE_REAP_BATCH_SIZE', 500))
+
+# Image previews, generated lazily at these widths and kept in an LRU cache
+PREVIEW_WIDTHS = (320, 640, 1280)
+PREVIEW_CACHE_MAX_BYTES = int(os.environ.get('PREVIEW_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Rendered document detail bodies, 'memory' (per worker LRU), 'filesystem'
+# (shared by the workers of one host) or empty to render every time
+FRAGMENT_CACHE = os.environ.get('FRAGMENT_CACHE', 'memory')
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 1000))
+FRAGMENT_CACHE_DIR = os.environ.get('FRAGMENT_CACHE_DIR', os.path.join(APP_ROOT_PATH, 'cache', 'fragments'))
@@ -0,0 +1,67 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+
+from .extensions import db
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+def engine_options(config):
+    '''SQLALCHEMY_ENGINE_OPTIONS for the configured database URI.'''
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        # Pooling is chosen by SQLAlchemy from the database path,
+        # the pragmas are applied on connect by init_app
+        return {}
+
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if url.get_backend_name() == 'postgresql' and config['DB_STATEMENT_TIMEOUT']:
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT']}"}
+    return options
+
+def sqlite_pragmas(config):
+    pragmas = []
+    if config['SQLITE_JOURNAL_MODE']:
+        pragmas.append(f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}")
+    if config['SQLITE_SYNCHRONOUS']:
+        pragmas.append(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}")
+    if config['SQLITE_BUSY_TIMEOUT']:
+        pragmas.append(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}")
+    if config['SQLITE_MMAP_SIZE']:
+        pragmas.append(f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}")
+    return pragmas
+
+def init_app(app):
+    # Must run right after db.init_app, before any connection is opened
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(app.config)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    '''Create the tables that do not exist yet.'''
+    # Kept out of create_app so workers do not reflect the schema at boot
+    db.create_all()
+    click.echo('Database tables created.')
@@ -0,0 +1,51 @@
+import os
+import zipfile
+
+from werkzeug.utils import secure_filename
+
+
+class _ZipBuffer:
+    '''
+    Write only sink for ZipFile. It has no seek or tell, so ZipFile writes
+    sizes in data descriptors after each entry and never goes back, which
+    lets the archive be sent as it is produced.
+    '''
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        # Nothing is yielded while the buffer is empty
+        if self._chunks:
+            yield b''.join(self._chunks)
+            self._chunks = []
+
+def stream_zip(entries, chunk_size):
+    '''
+    Yield a ZIP archive of (arcname, path) entries piece by piece. At most
+    one chunk of one file is held in memory. The attachments are PDFs and
+    images that are compressed already, so entries are stored as they are.
+    '''
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for arcname, path in entries:
+            with open(path, 'rb') as source, archive.open(arcname, 'w', force_zip64=True) as entry:
+                while chunk := source.read(chunk_size):
+                    entry.write(chunk)
+                    yield from buffer.drain()
+            # Data descriptor
+            yield from buffer.drain()
+    # Central directory
+    yield from buffer.drain()
+
+def archive_name(folio, group, file_id, file_url):
+    # Folios are free text, keep them from adding directories to the archive
+    folder = secure_filename(folio) or 'sin-folio'
+    extension = os.path.splitext(file_url)[1]
+    return f'{folder}/{group}/{file_id}{extension}'
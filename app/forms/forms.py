@@ -93,10 +93,19 @@ class FillDatabaseForm(FlaskForm):
 
 class FilterBillForm(FlaskForm):
     folio = StringField('Folio')
-
-    document_type = SelectField('Tipo', choices=[])
-    author = SelectField('Usuario', choices=[])
-    tags = SelectField('Etiqueta', choices=[])
+    # Full text search over folio, concept and description, ranked by relevance
+    q = StringField('Buscar')
+    # Range of bill dates, both ends included
+    date_from = DateField('Desde')
+    date_to = DateField('Hasta')
+
+    # Values that are not ids leave the data as None, the filter is dropped
+    document_type = SelectField('Tipo', choices=[], coerce=int)
+    author = SelectField('Usuario', choices=[], coerce=int)
+    # Several tags may be chosen, matched all together or any of them
+    tags = SelectMultipleField('Etiquetas', choices=[], coerce=int)
+    tags_match = SelectField('Coincidencia', choices=[('all', 'Todas las etiquetas'), ('any', 'Alguna etiqueta')],
+                             default='all')
 
     submit = SubmitField("Buscar")
 
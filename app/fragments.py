@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class MemoryFragmentCache:
+    '''Per process LRU of rendered fragments, at most max_entries of them.'''
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, bill_id, version, mask):
+        key = (bill_id, version, mask)
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+            return fragment
+
+    def set(self, bill_id, version, mask, fragment):
+        with self._lock:
+            self._entries[(bill_id, version, mask)] = fragment
+            self._entries.move_to_end((bill_id, version, mask))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, bill_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == bill_id]:
+                del self._entries[key]
+
+class FilesystemFragmentCache:
+    '''
+    Fragments stored as files under directory/<bill_id>/, shared by every
+    worker that sees the directory. Old versions are removed on invalidate.
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, bill_id, version, mask):
+        return os.path.join(self.directory, str(bill_id), f'{version}-{mask}.html')
+
+    def get(self, bill_id, version, mask):
+        try:
+            with open(self._path(bill_id, version, mask), encoding='utf-8') as cached:
+                return cached.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, bill_id, version, mask, fragment):
+        path = self._path(bill_id, version, mask)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and renamed so readers never see half a fragment
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as cached:
+            cached.write(fragment)
+        os.replace(temporary, path)
+
+    def invalidate(self, bill_id):
+        shutil.rmtree(os.path.join(self.directory, str(bill_id)), ignore_errors=True)
+
+class NullFragmentCache:
+    def get(self, bill_id, version, mask):
+        return None
+
+    def set(self, bill_id, version, mask, fragment):
+        pass
+
+    def invalidate(self, bill_id):
+        pass
+
+def fragment_cache():
+    return current_app.extensions['fragment_cache']
+
+def init_app(app):
+    # FRAGMENT_CACHE is 'memory', 'filesystem' or empty to disable it
+    backend = app.config['FRAGMENT_CACHE']
+    if backend == 'memory':
+        cache = MemoryFragmentCache(app.config['FRAGMENT_CACHE_MAX_ENTRIES'])
+    elif backend == 'filesystem':
+        cache = FilesystemFragmentCache(app.config['FRAGMENT_CACHE_DIR'])
+    elif not backend:
+        cache = NullFragmentCache()
+    else:
+        raise ValueError(f'Unknown FRAGMENT_CACHE backend {backend!r}')
+    app.extensions['fragment_cache'] = cache
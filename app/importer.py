@@ -0,0 +1,278 @@
+import csv
+import datetime
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, update
+
+from .cache import bump_version
+from .config import APP_ROOT_PATH
+from .extensions import db
+from .jobs import enqueue
+from .listing import refresh_listing
+from .models.models import Bill, Blob, DocumentType, File, FileGroup, Tag, User
+from .rollups import count_bills
+from .search import index_bill
+from .storage import blob_path, spool_local_file
+
+bills_cli = AppGroup('bills', help='Document maintenance.')
+
+# Manifest fields holding attachments, mapped to the Bill file group they fill
+FILE_FIELDS = ('bill_pdf', 'client_deposit_image', 'deposit_image')
+
+
+def read_manifest(path):
+    '''
+    Yield (line, record) pairs from a JSONL or CSV manifest, line counts data
+    rows from 1. In CSV files the tags and attachment columns separate their
+    values with ';'.
+    '''
+    with open(path, newline='', encoding='utf-8') as manifest:
+        if path.lower().endswith('.csv'):
+            for line, record in enumerate(csv.DictReader(manifest), start=1):
+                for field in ('tags',) + FILE_FIELDS:
+                    value = record.get(field) or ''
+                    record[field] = [item.strip() for item in value.split(';') if item.strip()]
+                yield line, record
+        else:
+            line = 0
+            for text_line in manifest:
+                if not text_line.strip():
+                    continue
+                line += 1
+                yield line, json.loads(text_line)
+
+def _list(value):
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path) as checkpoint:
+        return json.load(checkpoint)['line']
+
+def write_checkpoint(path, line):
+    # Written to a temporary file first so an interrupted write keeps the old one
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as checkpoint:
+        json.dump({'line': line}, checkpoint)
+    os.replace(temporary, path)
+
+
+class Importer:
+    '''
+    Loads manifest rows into Bill, FileGroup, File and bill_tag rows, one
+    transaction per batch. The ORM flushes each batch with multi row
+    INSERTs, attachments are hashed and copied by a thread pool straight
+    into the blob store spool. Folios already in the database are skipped,
+    so running the same manifest twice creates nothing new.
+    '''
+    def __init__(self, files_dir, default_author=None, workers=8):
+        self.files_dir = files_dir
+        self.workers = workers
+        self.chunk_size = current_app.config['UPLOAD_CHUNK_SIZE']
+        # Lookups by the names used in manifests
+        self.tags = {name: id for id, name in db.session.execute(db.select(Tag.id, Tag.name))}
+        self.document_types = {name: id for id, name in db.session.execute(
+            db.select(DocumentType.id, DocumentType.name))}
+        self.users = {email: id for id, email in db.session.execute(db.select(User.id, User.email))}
+        self.default_author = default_author
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+
+    def parse(self, line, record):
+        '''Validated column values for a manifest row, raises ValueError.'''
+        author = record.get('author') or self.default_author
+        if author not in self.users:
+            raise ValueError(f'unknown author {author!r}')
+        document_type = record.get('document_type')
+        if document_type not in self.document_types:
+            raise ValueError(f'unknown document type {document_type!r}')
+        tags = _list(record.get('tags'))
+        unknown = [tag for tag in tags if tag not in self.tags]
+        if unknown:
+            raise ValueError(f'unknown tags {unknown!r}')
+        files = {}
+        for field in FILE_FIELDS:
+            files[field] = [os.path.join(self.files_dir, name) for name in _list(record.get(field))]
+            for path in files[field]:
+                if not os.path.isfile(path):
+                    raise ValueError(f'missing file {path!r}')
+        return dict(
+            folio=str(record['folio']),
+            author_id=self.users[author],
+            document_type_id=self.document_types[document_type],
+            bill_date=datetime.date.fromisoformat(record['bill_date']),
+            payment_date=datetime.date.fromisoformat(record['payment_date']),
+            bill_concept=record.get('bill_concept') or '',
+            description=record.get('description') or '',
+            tag_ids=sorted({self.tags[tag] for tag in tags}),
+            files=files,
+        )
+
+    def import_batch(self, rows):
+        folios = [str(record.get('folio')) for line, record in rows]
+        existing = set(db.session.execute(
+            db.select(Bill.folio).where(Bill.folio.in_(folios))).scalars())
+
+        parsed = []
+        for line, record in rows:
+            folio = str(record.get('folio'))
+            if folio in existing:
+                self.skipped += 1
+                continue
+            try:
+                parsed.append(self.parse(line, record))
+            except (KeyError, TypeError, ValueError) as error:
+                self.errors.append((line, str(error)))
+                continue
+            existing.add(folio)
+        if not parsed:
+            return
+
+        paths = sorted({path for row in parsed for group in row['files'].values() for path in group})
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = {path: pool.submit(spool_local_file, path, self.chunk_size) for path in paths}
+        spools = {path: future.result() for path, future in futures.items() if not future.exception()}
+        failed = [future.exception() for future in futures.values() if future.exception()]
+        if failed:
+            for spool in spools.values():
+                spool.discard()
+            raise failed[0]
+        stored = []
+        try:
+            self._store(parsed, spools, stored)
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            for path in stored:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        finally:
+            for spool in spools.values():
+                spool.discard()
+        self.imported += len(parsed)
+
+    def _store(self, parsed, spools, stored):
+        # Every reference a checksum gets in this batch
+        references = {}
+        for row in parsed:
+            for group in row['files'].values():
+                for path in group:
+                    checksum = spools[path].checksum
+                    references[checksum] = references.get(checksum, 0) + 1
+
+        blobs = {blob.checksum: blob for blob in db.session.execute(
+            db.select(Blob).where(Blob.checksum.in_(references))).scalars()}
+        if blobs:
+            blobs_table = Blob.__table__
+            db.session.execute(
+                update(blobs_table)
+                .where(blobs_table.c.id == bindparam('blob_id'))
+                .values(ref_count=blobs_table.c.ref_count + bindparam('added')),
+                [{'blob_id': blob.id, 'added': references[checksum]} for checksum, blob in blobs.items()])
+
+        new_blobs = {}
+        for path, spool in spools.items():
+            if spool.checksum in blobs or spool.checksum in new_blobs:
+                continue
+            new_blobs[spool.checksum] = (path, Blob(
+                checksum=spool.checksum,
+                file_url=blob_path(spool.checksum, os.path.splitext(path)[1]),
+                size=spool.size, ref_count=references[spool.checksum]))
+        blobs.update({checksum: blob for checksum, (path, blob) in new_blobs.items()})
+        db.session.add_all(blob for path, blob in new_blobs.values())
+
+        tags = {tag.id: tag for tag in db.session.execute(
+            db.select(Tag).where(Tag.id.in_({id for row in parsed for id in row['tag_ids']}))).scalars()}
+        bills = []
+        for row in parsed:
+            groups = {}
+            for field, group in row['files'].items():
+                groups[field] = FileGroup(files=[
+                    File(file_url=blobs[spools[path].checksum].file_url,
+                         checksum=spools[path].checksum, size=spools[path].size,
+                         blob=blobs[spools[path].checksum])
+                    for path in group])
+            tag_ids = row.pop('tag_ids')
+            row.pop('files')
+            bill = Bill(**row, **groups)
+            bill.tags = [tags[tag_id] for tag_id in tag_ids]
+            bills.append(bill)
+        db.session.add_all(bills)
+        db.session.flush()
+
+        for bill in bills:
+            index_bill(bill)
+            for file_group in (bill.bill_pdf, bill.client_deposit_image, bill.deposit_image):
+                for file in file_group.files:
+                    enqueue('inspect_file', bill_id=bill.id, file_id=file.id)
+        refresh_listing([bill.id for bill in bills])
+        count_bills(bills)
+        if any(bill.tags for bill in bills):
+            bump_version('bill_tags')
+        db.session.flush()
+
+        # The blobs are moved into place last, and removed again by the
+        # caller if the commit does not happen
+        for checksum, (path, blob) in new_blobs.items():
+            destination = os.path.join(APP_ROOT_PATH, blob.file_url)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(spools[path].path, destination)
+            stored.append(destination)
+
+
+@bills_cli.command('import')
+@click.argument('manifest', type=click.Path(exists=True, dir_okay=False))
+@click.option('--files-dir', type=click.Path(exists=True, file_okay=False),
+              help='Directory the attachment names are relative to. Defaults to the manifest directory.')
+@click.option('--author', help='Email of the author of rows without an author column.')
+@click.option('--batch-size', default=500, show_default=True, help='Rows per transaction.')
+@click.option('--workers', default=8, show_default=True, help='Threads copying attachments.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False),
+              help='Progress file, defaults to MANIFEST.checkpoint.')
+def import_command(manifest, files_dir, author, batch_size, workers, checkpoint):
+    '''
+    Import documents from a JSONL or CSV manifest.
+
+    Each row has folio, bill_date, payment_date (ISO dates), bill_concept,
+    description, document_type and tags (by name), author (email) and the
+    attachments bill_pdf, client_deposit_image and deposit_image. Progress
+    is checkpointed after every batch, rerunning an interrupted import
+    resumes after the last committed batch and skips folios that exist.
+    '''
+    files_dir = files_dir or os.path.dirname(os.path.abspath(manifest))
+    checkpoint = checkpoint or manifest + '.checkpoint'
+    done = read_checkpoint(checkpoint)
+    if done:
+        click.echo(f'Resuming after row {done}.')
+
+    importer = Importer(files_dir, default_author=author, workers=workers)
+    batch = []
+    last_line = done
+    for line, record in read_manifest(manifest):
+        if line <= done:
+            continue
+        batch.append((line, record))
+        last_line = line
+        if len(batch) >= batch_size:
+            importer.import_batch(batch)
+            write_checkpoint(checkpoint, last_line)
+            click.echo(f'{last_line} rows processed.')
+            batch = []
+    if batch:
+        importer.import_batch(batch)
+        write_checkpoint(checkpoint, last_line)
+
+    for line, error in importer.errors:
+        click.echo(f'Row {line}: {error}', err=True)
+    click.echo(f'{importer.imported} documents imported, {importer.skipped} already present, '
+               f'{len(importer.errors)} rows with errors.')
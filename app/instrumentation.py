@@ -0,0 +1,237 @@
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import (Blueprint, Response, abort, before_render_template, current_app, g,
+                   has_app_context, request, template_rendered)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryLimitExceeded(RuntimeError):
+    pass
+
+metrics_blueprint = Blueprint('metrics', __name__)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    # Only statements issued while serving a request are counted
+    if has_app_context() and 'query_count' in g:
+        g.query_count += 1
+        conn.info['query_start'] = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def time_statement(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop('query_start', None)
+    if start is not None and has_app_context() and 'query_count' in g:
+        g.sql_time += time.perf_counter() - start
+
+def reset_query_count():
+    g.query_count = 0
+    g.sql_time = 0.0
+    g.template_time = 0.0
+    g.request_start = time.perf_counter()
+
+def check_query_limit(response):
+    # Limits are configured per endpoint, e.g. {'bills.get_all': 8}
+    limit = current_app.config['QUERY_LIMITS'].get(request.endpoint)
+    count = g.get('query_count', 0)
+    if limit is None or count <= limit:
+        return response
+
+    message = f'{request.endpoint} issued {count} SQL statements (limit {limit})'
+    if current_app.testing or current_app.config.get('QUERY_LIMIT_RAISE'):
+        raise QueryLimitExceeded(message)
+    current_app.logger.warning(message)
+    return response
+
+def _template_started(sender, template, context, **extra):
+    if has_app_context() and 'template_time' in g:
+        g.setdefault('template_starts', []).append(time.perf_counter())
+
+def _template_finished(sender, template, context, **extra):
+    starts = g.get('template_starts') if has_app_context() else None
+    if starts:
+        g.template_time += time.perf_counter() - starts.pop()
+
+
+class Metrics:
+    '''
+    Per process request metrics, rendered in the Prometheus text format.
+    With several workers every process reports its own numbers, Prometheus
+    is expected to scrape them separately or sum them.
+    '''
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # endpoint -> per bucket counts, the last one is +Inf
+        self.latency = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+        self.latency_sum = Counter()
+        # (endpoint, method, status) -> requests
+        self.requests = Counter()
+        self.sql_statements = Counter()
+        self.sql_seconds = Counter()
+        self.template_seconds = Counter()
+        self.response_bytes = Counter()
+
+    def observe(self, endpoint, method, status, duration, statements, sql_time, template_time, size):
+        with self._lock:
+            counts = self.latency[endpoint]
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self.latency_sum[endpoint] += duration
+            self.requests[endpoint, method, status] += 1
+            self.sql_statements[endpoint] += statements
+            self.sql_seconds[endpoint] += sql_time
+            self.template_seconds[endpoint] += template_time
+            self.response_bytes[endpoint] += size
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines += ['# HELP docmanager_request_duration_seconds Time spent serving requests.',
+                      '# TYPE docmanager_request_duration_seconds histogram']
+            for endpoint, counts in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'docmanager_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'docmanager_request_duration_seconds_sum{{endpoint="{endpoint}"}} {self.latency_sum[endpoint]:.6f}')
+                lines.append(f'docmanager_request_duration_seconds_count{{endpoint="{endpoint}"}} {cumulative}')
+
+            lines += ['# HELP docmanager_requests_total Requests served.',
+                      '# TYPE docmanager_requests_total counter']
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'docmanager_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+            for name, help, counter in (
+                ('sql_statements_total', 'SQL statements issued.', self.sql_statements),
+                ('sql_seconds_total', 'Time spent executing SQL statements.', self.sql_seconds),
+                ('template_seconds_total', 'Time spent rendering templates.', self.template_seconds),
+                ('response_bytes_total', 'Response body bytes, streamed bodies excluded.', self.response_bytes),
+            ):
+                lines += [f'# HELP docmanager_{name} {help}', f'# TYPE docmanager_{name} counter']
+                for endpoint, value in sorted(counter.items()):
+                    lines.append(f'docmanager_{name}{{endpoint="{endpoint}"}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+class SlowRequestSampler:
+    '''
+    Sampling profiler for requests. One daemon thread takes the stack of
+    every thread that is serving a request each `interval` seconds; the
+    samples of a request slower than the threshold are written out as
+    collapsed stacks (one "frame;frame;frame count" line per stack), the
+    input format of flamegraph.pl and speedscope.
+    '''
+    def __init__(self, interval, directory):
+        self.interval = interval
+        self.directory = directory
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            samples = self._active[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='slow-request-sampler', daemon=True)
+                self._thread.start()
+        return samples
+
+    def stop(self):
+        with self._lock:
+            return self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def dump(self, samples, endpoint, duration):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{endpoint}-{int(duration * 1000)}ms.txt'
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as trace:
+            for stack, count in samples.most_common():
+                trace.write(f'{stack} {count}\n')
+        return path
+
+def start_profile():
+    sampler = current_app.extensions.get('slow_request_sampler')
+    if sampler is not None:
+        sampler.start()
+
+def record_metrics(response):
+    duration = time.perf_counter() - g.get('request_start', time.perf_counter())
+    endpoint = request.endpoint or 'unmatched'
+    # Streamed responses have no length until they are sent
+    size = 0 if response.is_streamed else (response.content_length or 0)
+    current_app.extensions['metrics'].observe(
+        endpoint, request.method, response.status_code, duration,
+        g.get('query_count', 0), g.get('sql_time', 0.0), g.get('template_time', 0.0), size)
+
+    sampler = current_app.extensions.get('slow_request_sampler')
+    if sampler is not None:
+        samples = sampler.stop()
+        if samples and duration * 1000 >= current_app.config['SLOW_REQUEST_MS']:
+            path = sampler.dump(samples, endpoint, duration)
+            current_app.logger.warning('Slow request %s %s took %.0f ms, profile in %s',
+                                       request.method, request.path, duration * 1000, path)
+    return response
+
+def discard_profile(exc=None):
+    # Requests that never reached after_request leave no samples behind
+    sampler = current_app.extensions.get('slow_request_sampler')
+    if sampler is not None:
+        sampler.stop()
+
+@metrics_blueprint.route('/metrics')
+def metrics():
+    token = current_app.config['METRICS_TOKEN']
+    # Without a token the metrics are only collected, never served
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    return Response(current_app.extensions['metrics'].render(),
+                    mimetype='text/plain; version=0.0.4')
+
+def init_app(app):
+    app.before_request(reset_query_count)
+    app.after_request(check_query_limit)
+
+    if app.config['METRICS_ENABLED']:
+        app.extensions['metrics'] = Metrics(app.config['METRICS_BUCKETS'])
+        before_render_template.connect(_template_started, app)
+        template_rendered.connect(_template_finished, app)
+        if app.config['SLOW_REQUEST_MS']:
+            app.extensions['slow_request_sampler'] = SlowRequestSampler(
+                app.config['SLOW_REQUEST_SAMPLE_INTERVAL'], app.config['SLOW_REQUEST_PROFILE_DIR'])
+            app.before_request(start_profile)
+            app.teardown_request(discard_profile)
+        # after_request functions run in reverse order, so the request is
+        # recorded even when the query limit check raises
+        app.after_request(record_metrics)
+        app.register_blueprint(metrics_blueprint)
@@ -0,0 +1,169 @@
+import mimetypes
+import multiprocessing
+import os
+import re
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import update
+
+from .config import APP_ROOT_PATH
+from .extensions import db
+from .models.models import File, Job
+from .storage import reap_tombstones
+
+
+jobs_cli = AppGroup('jobs', help='Background job queue stored in the database.')
+
+# kind -> function(job)
+HANDLERS = {}
+
+def job_handler(kind):
+    def decorator(f):
+        HANDLERS[kind] = f
+        return f
+    return decorator
+
+def enqueue(kind, bill_id=None, **payload):
+    # Added to the current transaction, workers see it once the caller commits
+    job = Job(kind=kind, bill_id=bill_id, payload=payload)
+    db.session.add(job)
+    return job
+
+def claim_job():
+    '''
+    Mark the oldest pending job as running and return it, or None.
+    Postgres skips rows locked by other workers, on SQLite the database
+    write lock serializes the claim. The conditional update guarantees 
+    that a job is only claimed once either way.
+    '''
+    now = datetime.utcnow()
+    # Jobs of workers that died half way are given back to the queue,
+    # unless they used up their attempts, a job that kills its worker
+    # would otherwise be retried forever
+    stale = (Job.status == 'running',
+             Job.started_at < now - timedelta(seconds=current_app.config['JOB_TIMEOUT']))
+    max_attempts = current_app.config['JOB_MAX_ATTEMPTS']
+    db.session.execute(
+        update(Job)
+        .where(*stale, Job.attempts < max_attempts)
+        .values(status='pending'))
+    db.session.execute(
+        update(Job)
+        .where(*stale, Job.attempts >= max_attempts)
+        .values(status='failed', finished_at=now,
+                error=f'Worker did not finish the job within JOB_TIMEOUT after {max_attempts} attempts'))
+
+    while True:
+        job_id = db.session.execute(
+            db.select(Job.id)
+            .where(Job.status == 'pending')
+            .order_by(Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == 'pending')
+            .values(status='running', started_at=now, attempts=Job.attempts + 1)).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+
+def run_job(job):
+    handler = HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f'No handler for job kind {job.kind!r}')
+        handler(job)
+        job.status = 'done'
+        job.error = None
+    except Exception:
+        error = traceback.format_exc()
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.error = error
+        job.status = 'pending' if job.attempts < current_app.config['JOB_MAX_ATTEMPTS'] else 'failed'
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+def work(burst=False, poll_interval=1.0):
+    # Run jobs until stopped, or until the queue is empty when burst is set
+    while True:
+        job = claim_job()
+        if job is None:
+            if burst:
+                return
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+
+def _worker_process(burst, poll_interval):
+    # Each worker builds its own app, connections are never shared with the parent
+    from . import create_app
+    app = create_app()
+    with app.app_context():
+        work(burst, poll_interval)
+
+@jobs_cli.command('work')
+@click.option('--processes', '-p', default=1, show_default=True, help='Number of worker processes.')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to wait when the queue is empty.')
+def work_command(processes, burst, poll_interval):
+    '''Process queued jobs with a pool of worker processes.'''
+    if processes == 1:
+        work(burst, poll_interval)
+        return
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_worker_process, args=(burst, poll_interval))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+# Leading bytes of the formats users upload
+MAGIC_NUMBERS = (
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+PDF_PAGE = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+def sniff_mime_type(path, head):
+    for magic, mime_type in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mime_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+@job_handler('inspect_file')
+def inspect_file(job):
+    # MIME type from the content and page count of PDFs
+    file = db.session.get(File, job.payload['file_id'])
+    if file is None:
+        return
+    path = os.path.join(APP_ROOT_PATH, file.file_url)
+    with open(path, 'rb') as stored:
+        head = stored.read(16)
+        file.mime_type = sniff_mime_type(path, head)
+        if file.mime_type == 'application/pdf':
+            stored.seek(0)
+            file.page_count = len(PDF_PAGE.findall(stored.read()))
+
+@job_handler('reap_files')
+def reap_files(job):
+    # Unlink the files of committed deletions
+    reap_tombstones()
@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, insert, update
+
+from .cache import bump_version
+from .extensions import db
+from .models.models import Bill, BillListing, DocumentType, User, bill_tag
+
+
+listing_cli = AppGroup('listing', help='Projection of the bills read by the document list.')
+
+# Bumped whenever rows of the projection are written or removed, the cached
+# facet counts of every worker are dropped within CACHE_VERSION_TTL
+LISTING_VERSION = 'bill_listing'
+
+def pack_tag_ids(tag_ids):
+    return ',' + ''.join(f'{tag_id},' for tag_id in sorted(tag_ids))
+
+def unpack_tag_ids(packed):
+    return [int(tag_id) for tag_id in packed.split(',') if tag_id]
+
+def has_tag(tag_id):
+    return BillListing.tag_ids.contains(f',{int(tag_id)},')
+
+def listing_rows(bill_ids):
+    '''Projection rows of the given bills, read with two queries.'''
+    tags = defaultdict(list)
+    for bill_id, tag_id in db.session.execute(
+            db.select(bill_tag.c.bill_id, bill_tag.c.tag_id).where(bill_tag.c.bill_id.in_(bill_ids))):
+        tags[bill_id].append(tag_id)
+
+    rows = db.session.execute(
+        db.select(Bill.id, Bill.folio, Bill.bill_concept, Bill.bill_date,
+                  Bill.author_id, User.name, Bill.document_type_id, DocumentType.name)
+        .outerjoin(User, User.id == Bill.author_id)
+        .outerjoin(DocumentType, DocumentType.id == Bill.document_type_id)
+        .where(Bill.id.in_(bill_ids)))
+    return [dict(id=id, folio=folio, bill_concept=bill_concept, bill_date=bill_date,
+                 author_id=author_id, author_name=author_name,
+                 document_type_id=document_type_id, document_type_name=document_type_name,
+                 tag_ids=pack_tag_ids(tags[id]))
+            for id, folio, bill_concept, bill_date, author_id, author_name,
+                document_type_id, document_type_name in rows]
+
+def refresh_listing(bill_ids):
+    # Runs in the caller's transaction, pending changes of the bills are
+    # flushed by the selects before they are read back
+    bill_ids = list(bill_ids)
+    if not bill_ids:
+        return
+    rows = listing_rows(bill_ids)
+    db.session.execute(delete(BillListing).where(BillListing.id.in_(bill_ids)))
+    if rows:
+        db.session.execute(insert(BillListing), rows)
+    bump_version(LISTING_VERSION)
+
+def unlist_bill(bill_id):
+    db.session.execute(delete(BillListing).where(BillListing.id == bill_id))
+    bump_version(LISTING_VERSION)
+
+def rename_author(user_id, name):
+    db.session.execute(update(BillListing).where(BillListing.author_id == user_id).values(author_name=name))
+
+def unlist_author(user_id):
+    # Deleting a user leaves its bills without an author
+    db.session.execute(update(BillListing).where(BillListing.author_id == user_id)
+                       .values(author_id=None, author_name=None))
+    bump_version(LISTING_VERSION)
+
+def rebuild_listing(batch_size=5000):
+    '''Regenerate the whole projection from the bills, returns the rows written.'''
+    db.session.execute(delete(BillListing))
+    bump_version(LISTING_VERSION)
+    written = 0
+    last_id = 0
+    while True:
+        bill_ids = db.session.execute(
+            db.select(Bill.id).where(Bill.id > last_id).order_by(Bill.id).limit(batch_size)).scalars().all()
+        if not bill_ids:
+            break
+        refresh_listing(bill_ids)
+        written += len(bill_ids)
+        last_id = bill_ids[-1]
+    db.session.commit()
+    return written
+
+@listing_cli.command('rebuild')
+@click.option('--batch-size', default=5000, show_default=True, help='Bills read per query.')
+def rebuild_command(batch_size):
+    '''Regenerate the bill_listing table from the bills.'''
+    click.echo(f'{rebuild_listing(batch_size)} bills listed.')
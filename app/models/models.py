@@ -1,7 +1,11 @@
+from datetime import datetime
+
+from flask import current_app
 from flask_login import UserMixin
-from sqlalchemy import text
+from sqlalchemy import DDL, event
 from sqlalchemy.orm import relationship
 
+from ..config import SEARCH_LANGUAGE
 from ..extensions import db
 
 class BaseSoftDeletion(db.Model):
@@ -25,9 +29,27 @@ class User(UserMixin, db.Model):
     posts = relationship("Bill", back_populates="author")
 
     def to_dict(self):
+        # Explicit fields, the password hash is never serialized
+        return {'id': self.id, 'email': self.email, 'name': self.name, 'role_id': self.role_id}
+
+class CacheVersion(db.Model):
+    # Version counters used to invalidate the per-worker caches
+    __tablename__ = 'cache_versions'
+    name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
 
-        #Method 2. Altenatively use Dictionary Comprehension to do the same thing.
-        return {column.name: getattr(self, column.name) for column in self.__table__.columns}   
+class ApiToken(db.Model):
+    # Bearer tokens of the JSON API, only the keyed digest of a token is stored
+    __tablename__ = 'api_tokens'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), index=True, nullable=False)
+    user = relationship('User')
+    name = db.Column(db.String(100), nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    # First characters of the token, shown to tell tokens apart
+    prefix = db.Column(db.String(16), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    revoked_at = db.Column(db.DateTime, nullable=True)
 
 class Role(BaseSoftDeletion):
     __tablename__ = 'roles'
@@ -64,6 +86,33 @@ class Role(BaseSoftDeletion):
     # Relationship to User
     users = relationship("User", back_populates="role")  
 
+# Order of the permission flags inside a PermissionSet bitmask
+PERMISSIONS = (
+    'can_view_users', 'can_edit_users', 'can_delete_users', 'can_create_users',
+    'can_view_bills', 'can_edit_bills', 'can_delete_bills', 'can_create_bills',
+    'can_view_tags', 'can_edit_tags', 'can_delete_tags', 'can_create_tags',
+    'can_view_roles', 'can_edit_roles', 'can_delete_roles', 'can_create_roles',
+    'can_manage_document_types',
+)
+PERMISSION_BITS = {name: 1 << i for i, name in enumerate(PERMISSIONS)}
+
+class PermissionSet(int):
+    # Immutable bitmask of the can_* flags of a role, 
+    # flags can be read as attributes: permissions.can_view_bills
+    def __getattr__(self, name):
+        try:
+            return bool(self & PERMISSION_BITS[name])
+        except KeyError:
+            raise AttributeError(name)
+
+    @classmethod
+    def from_flags(cls, flags):
+        mask = 0
+        for name, flag in zip(PERMISSIONS, flags):
+            if flag:
+                mask |= PERMISSION_BITS[name]
+        return cls(mask)
+
 class DocumentType(BaseSoftDeletion):
     __tablename__ = 'document_types'
     id = db.Column(db.Integer, primary_key=True)
@@ -101,11 +150,90 @@ class Bill(db.Model):
 
     tags = db.relationship('Tag', secondary = 'bill_tag', back_populates = 'bills')
 
+    # Incremented by every ORM update of the row, keys the rendered detail cache
+    # and makes concurrent edits of the same bill fail instead of overwriting
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __mapper_args__ = {'version_id_col': version}
+
+    # Matched to the get_filter conditions combined with ORDER BY folio DESC, id DESC
+    __table_args__ = (
+        db.Index('ix_bills_folio_id', 'folio', 'id'),
+        db.Index('ix_bills_author_id_folio_id', 'author_id', 'folio', 'id'),
+        db.Index('ix_bills_document_type_id_folio_id', 'document_type_id', 'folio', 'id'),
+    )
+
+class BillListing(db.Model):
+    # Projection of a bill with what the document list shows and filters on,
+    # one row per bill written in the same transaction as the bill by
+    # app.listing. `flask listing rebuild` regenerates it from the bills.
+    __tablename__ = 'bill_listing'
+    id = db.Column(db.Integer, db.ForeignKey('bills.id', ondelete='CASCADE'), primary_key=True)
+    folio = db.Column(db.String(250), nullable=False)
+    bill_concept = db.Column(db.Text, nullable=False)
+    bill_date = db.Column(db.Date, nullable=False)
+    author_id = db.Column(db.Integer, nullable=True)
+    author_name = db.Column(db.String(100), nullable=True)
+    document_type_id = db.Column(db.Integer, nullable=True)
+    document_type_name = db.Column(db.String(250), nullable=True)
+    # Tag ids packed as ',3,17,', one tag is matched with LIKE '%,17,%'
+    tag_ids = db.Column(db.Text, nullable=False, default=',')
+
+    __table_args__ = (
+        db.Index('ix_bill_listing_folio_id', 'folio', 'id'),
+        db.Index('ix_bill_listing_author_id_folio_id', 'author_id', 'folio', 'id'),
+        db.Index('ix_bill_listing_document_type_id_folio_id', 'document_type_id', 'folio', 'id'),
+        db.Index('ix_bill_listing_bill_date', 'bill_date'),
+    )
+
+class BillMonthlyCount(db.Model):
+    # Number of bills per month of bill_date, document type and author, kept
+    # up to date by app.rollups. Bills without a type or author count under 0.
+    __tablename__ = 'bill_monthly_counts'
+    month = db.Column(db.Date, primary_key=True)
+    document_type_id = db.Column(db.Integer, primary_key=True)
+    author_id = db.Column(db.Integer, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+class BillMonthlyTagCount(db.Model):
+    # Number of bills per month of bill_date and tag
+    __tablename__ = 'bill_monthly_tag_counts'
+    month = db.Column(db.Date, primary_key=True)
+    tag_id = db.Column(db.Integer, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+# Full text index over folio, concept and description.
+# SQLite uses an FTS5 table keyed by the bill id, kept in sync by app.search.
+# Postgres uses a generated tsvector column with a GIN index.
+event.listen(Bill.__table__, 'after_create', DDL(
+    "CREATE VIRTUAL TABLE bills_fts USING fts5("
+    "folio, bill_concept, description, tokenize = 'unicode61 remove_diacritics 2')"
+).execute_if(dialect='sqlite'))
+event.listen(Bill.__table__, 'after_create', DDL(
+    "INSERT INTO bills_fts (bills_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')"
+).execute_if(dialect='sqlite'))
+event.listen(Bill.__table__, 'before_drop', DDL(
+    "DROP TABLE IF EXISTS bills_fts"
+).execute_if(dialect='sqlite'))
+event.listen(Bill.__table__, 'after_create', DDL(
+    "ALTER TABLE bills ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    f"setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(folio, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(bill_concept, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(description, '')), 'C')) STORED"
+).execute_if(dialect='postgresql'))
+event.listen(Bill.__table__, 'after_create', DDL(
+    "CREATE INDEX ix_bills_search_vector ON bills USING GIN (search_vector)"
+).execute_if(dialect='postgresql'))
+
 # Join table for stablishing a many to many relationship between Bill and Tag
 bill_tag = db.Table(
   'bill_tag',
    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id')),
-   db.Column('bill_id', db.Integer, db.ForeignKey('bills.id'))
+   db.Column('bill_id', db.Integer, db.ForeignKey('bills.id')),
+   # (tag_id, bill_id) serves the Bill.tags.any() EXISTS subquery,
+   # (bill_id, tag_id) loading the tags of a page of bills
+   db.Index('ix_bill_tag_tag_id_bill_id', 'tag_id', 'bill_id'),
+   db.Index('ix_bill_tag_bill_id_tag_id', 'bill_id', 'tag_id')
 ) 
 
 class Tag(BaseSoftDeletion):
@@ -119,12 +247,43 @@ class File(db.Model):
     __tablename__ = "files"
     id = db.Column(db.Integer, primary_key=True)
     file_url = db.Column(db.String(250), nullable=False)
+    # SHA-256 hex digest and size in bytes, computed while the upload is stored
+    checksum = db.Column(db.String(64), nullable=True)
+    size = db.Column(db.Integer, nullable=True)
+    # Filled in the background by the inspect_file job
+    mime_type = db.Column(db.String(100), nullable=True)
+    page_count = db.Column(db.Integer, nullable=True)
 
     # Make a relationship between file and file group 
     # Foreign key
-    id_group = db.Column(db.Integer, db.ForeignKey("files_groups.id"))
+    id_group = db.Column(db.Integer, db.ForeignKey("files_groups.id"), index=True)
     file_group = relationship("FileGroup", back_populates = 'files')
 
+    # Content addressed copy shared by every file with the same checksum,
+    # file_url points at the blob. Files uploaded before the blob store have none.
+    blob_id = db.Column(db.Integer, db.ForeignKey("blobs.id"), index=True, nullable=True)
+    blob = relationship("Blob", back_populates='files')
+
+class Blob(db.Model):
+    __tablename__ = "blobs"
+    id = db.Column(db.Integer, primary_key=True)
+    checksum = db.Column(db.String(64), unique=True, nullable=False)
+    file_url = db.Column(db.String(250), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    # Number of File rows pointing at this blob, unlinked when it drops to 0
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+
+    files = relationship("File", back_populates='blob')
+
+class FileTombstone(db.Model):
+    # Stored file waiting to be unlinked by the reaper after its deletion committed
+    __tablename__ = "file_tombstones"
+    id = db.Column(db.Integer, primary_key=True)
+    file_url = db.Column(db.String(250), nullable=False)
+    # Blob that had no references left, the reaper skips it if it was reused meanwhile
+    blob_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 class FileGroup(db.Model):
     __tablename__ = "files_groups"
     id = db.Column(db.Integer, primary_key=True)\
@@ -132,15 +291,41 @@ class FileGroup(db.Model):
     #TODO: rename this variable form files to file
     files = relationship("File", back_populates='file_group')
 
+class Job(db.Model):
+    # Background work queue, consumed by `flask jobs work`
+    __tablename__ = "jobs"
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # pending -> running -> done | failed
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    # Document the job works on, used to show its progress
+    bill_id = db.Column(db.Integer, db.ForeignKey("bills.id", ondelete='CASCADE'), index=True, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_jobs_status_id', 'status', 'id'),
+    )
+
 def test_db_integrity():
-    try:
-        # Simple query to test the connection
-        db.session.execute(text('SELECT 1'))
-        if not db.session.execute(db.select(Role)).all():
-            return False
-        if not db.session.execute(db.select(User)).all():
-            return False
+    # Once the first role and user exist they stay, so a positive answer is
+    # kept for the life of the process and later calls cost no query
+    if current_app.extensions.get('db_integrity'):
         return True
+    try:
+        roles, users = db.session.execute(
+            db.select(db.select(Role.id).exists(), db.select(User.id).exists())).one()
     except Exception as e:
-        print(f"Database connection error: {e}")
-        return False
\ No newline at end of file
+        db.session.rollback()
+        current_app.logger.error('Database connection error: %s', e)
+        return False
+    if roles and users:
+        current_app.extensions['db_integrity'] = True
+        return True
+    return False
@@ -0,0 +1,124 @@
+import base64
+import binascii
+import json
+from datetime import date
+
+from sqlalchemy import Date, and_, func, or_, select, text
+
+from .extensions import db
+
+
+class KeysetPage:
+    '''
+    One page of a seek based listing. It exposes has_prev/has_next like
+    Flask-SQLAlchemy's Pagination, plus opaque cursors for the links.
+    '''
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None, total_is_estimate=False):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        # Number of matching rows, only computed when it was requested
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def encode_cursor(values, direction):
+    payload = json.dumps([direction, list(values)], separators=(',', ':'), default=date.isoformat)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token, order_by):
+    # Returns (direction, values), a malformed cursor restarts from page one
+    if not token:
+        return 'next', None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError, binascii.Error):
+        return 'next', None
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        return 'next', None
+    if len(values) != len(order_by):
+        return 'next', None
+    if not all(value is None or isinstance(value, (str, int, float)) for value in values):
+        return 'next', None
+    try:
+        # JSON has no dates, the date keys travel as ISO strings
+        values = [date.fromisoformat(value) if isinstance(column.type, Date) and value is not None else value
+                  for (column, _), value in zip(order_by, values)]
+    except (ValueError, TypeError):
+        return 'next', None
+    return direction, values
+
+def seek_condition(order_by, values, forward):
+    # Expands (a, b) > (x, y) into (a > x) OR (a = x AND b > y) so that
+    # every column may have its own direction
+    conditions = []
+    for i, ((column, descending), value) in enumerate(zip(order_by, values)):
+        after = (column < value) if descending == forward else (column > value)
+        equal = [prev_column == prev_value 
+                 for (prev_column, _), prev_value in zip(order_by[:i], values[:i])]
+        conditions.append(and_(*equal, after))
+    return or_(*conditions)
+
+def approximate_count(stmt, cap=1000):
+    '''
+    Number of rows of a select without a full COUNT(*). Postgres answers 
+    from the planner statistics, other databases count at most `cap` rows.
+    Returns (count, is_estimate).
+    '''
+    if db.engine.dialect.name == 'postgresql':
+        compiled = stmt.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+        plan = db.session.execute(text(f'EXPLAIN (FORMAT JSON) {compiled}')).scalar()
+        return int(plan[0]['Plan']['Plan Rows']), True
+    limited = stmt.order_by(None).limit(cap).subquery()
+    count = db.session.execute(select(func.count()).select_from(limited)).scalar()
+    return count, count >= cap
+
+def keyset_paginate(stmt, order_by, key, per_page, cursor=None, count=False, scalars=True):
+    '''
+    Seek based pagination for a select statement.
+    order_by is a list of (column, descending) pairs that must end in a
+    unique column and key(item) returns the values of those columns for a
+    result item (a row when scalars is False). Every page costs the same 
+    no matter how deep it is.
+    '''
+    direction, values = decode_cursor(cursor, order_by)
+    forward = direction == 'next'
+
+    page_stmt = stmt
+    if values is not None:
+        page_stmt = page_stmt.where(seek_condition(order_by, values, forward))
+    page_stmt = page_stmt.order_by(*[
+        column.desc() if descending == forward else column.asc()
+        for column, descending in order_by
+    ]).limit(per_page + 1)
+
+    result = db.session.execute(page_stmt)
+    items = result.scalars().all() if scalars else result.all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if not forward:
+        items.reverse()
+
+    next_cursor = prev_cursor = None
+    if items:
+        if has_more or not forward:
+            next_cursor = encode_cursor(key(items[-1]), 'next')
+        if values is not None and (forward or has_more):
+            prev_cursor = encode_cursor(key(items[0]), 'prev')
+
+    total, total_is_estimate = approximate_count(stmt) if count else (None, False)
+    return KeysetPage(items, next_cursor, prev_cursor, total, total_is_estimate)
@@ -0,0 +1,87 @@
+import os
+import tempfile
+
+from flask import current_app, send_file
+
+from .config import APP_ROOT_PATH, UPLOAD_DESTINATION
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional, previews fall back to the original file
+    Image = None
+
+PREVIEW_DIR = os.path.join(APP_ROOT_PATH, UPLOAD_DESTINATION, 'previews')
+
+
+def can_preview(file):
+    return Image is not None and (file.mime_type or 'image/').startswith('image/')
+
+def preview_path(file, width):
+    # Variants of identical content are shared, like the blobs they come from
+    key = file.checksum or f'file-{file.id}'
+    return os.path.join(PREVIEW_DIR, f'{key}-{width}.jpg')
+
+def evict_previews(max_bytes, keep=None):
+    # Least recently used variants go first, hits refresh the mtime.
+    # `keep` is the variant about to be sent
+    entries = []
+    total = 0
+    with os.scandir(PREVIEW_DIR) as scan:
+        for entry in scan:
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def generate_preview(source, destination, width):
+    with Image.open(source) as image:
+        # Phone pictures are stored sideways with an EXIF orientation
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width, width * 4))
+        os.makedirs(PREVIEW_DIR, exist_ok=True)
+        # Written aside and renamed so concurrent requests never read half a file
+        handle, partial = tempfile.mkstemp(dir=PREVIEW_DIR, suffix='.part')
+        try:
+            with os.fdopen(handle, 'wb') as output:
+                image.convert('RGB').save(output, 'JPEG', quality=80, optimize=True)
+            os.replace(partial, destination)
+        except BaseException:
+            # Truncated images fail half way through, leave no .part behind
+            os.unlink(partial)
+            raise
+
+def send_preview(file, width):
+    '''
+    Downscaled JPEG of an image file, generated on first request and kept
+    in a size bounded LRU directory under files/previews.
+    Returns None when no preview can be made.
+    '''
+    if not can_preview(file):
+        return None
+    path = preview_path(file, width)
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        try:
+            generate_preview(os.path.join(APP_ROOT_PATH, file.file_url), path, width)
+        except (OSError, Image.DecompressionBombError):
+            # Not an image Pillow can read
+            return None
+        evict_previews(current_app.config['PREVIEW_CACHE_MAX_BYTES'], keep=path)
+
+    response = send_file(path, mimetype='image/jpeg', conditional=True,
+                         etag=f'{os.path.basename(path)}', max_age=current_app.config['FILE_MAX_AGE'])
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
@@ -0,0 +1,108 @@
+from collections import Counter
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Date, cast, delete, func, insert, update
+
+from .database import UPSERTS
+from .extensions import db
+from .models.models import Bill, BillMonthlyCount, BillMonthlyTagCount, bill_tag
+
+
+rollups_cli = AppGroup('rollups', help='Monthly document counts shown by the dashboard.')
+
+COUNT_KEYS = ('month', 'document_type_id', 'author_id')
+TAG_COUNT_KEYS = ('month', 'tag_id')
+
+def month_of(day):
+    return day.replace(day=1)
+
+def _increment(table, keys, deltas):
+    # Adds every delta to the total of its key, creating missing rows
+    rows = [dict(zip(keys, key), total=total) for key, total in deltas.items() if total]
+    if not rows:
+        return
+    upsert = UPSERTS.get(db.engine.dialect.name)
+    if upsert is not None:
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=list(keys),
+                                          set_={'total': table.c.total + stmt.excluded.total})
+        db.session.execute(stmt, rows)
+        return
+    for row in rows:
+        updated = db.session.execute(
+            update(table)
+            .where(*[table.c[key] == row[key] for key in keys])
+            .values(total=table.c.total + row['total'])).rowcount
+        if not updated:
+            db.session.execute(insert(table).values(**row))
+
+class RollupDelta:
+    '''
+    Changes to the monthly counts, collected while bills are written and
+    applied in the same transaction with one statement per table.
+    '''
+    def __init__(self):
+        self.counts = Counter()
+        self.tag_counts = Counter()
+
+    def add_bill(self, bill, sign=1):
+        # Reads the foreign keys, the bill must have been flushed
+        month = month_of(bill.bill_date)
+        self.counts[month, bill.document_type_id or 0, bill.author_id or 0] += sign
+        for tag in bill.tags:
+            self.tag_counts[month, tag.id] += sign
+
+    def apply(self):
+        _increment(BillMonthlyCount.__table__, COUNT_KEYS, self.counts)
+        _increment(BillMonthlyTagCount.__table__, TAG_COUNT_KEYS, self.tag_counts)
+        self.counts.clear()
+        self.tag_counts.clear()
+
+def count_bills(bills, sign=1):
+    delta = RollupDelta()
+    for bill in bills:
+        delta.add_bill(bill, sign)
+    delta.apply()
+
+def reassign_author(user_id):
+    # The bills of a deleted user lose their author, so do their counts
+    table = BillMonthlyCount.__table__
+    rows = db.session.execute(
+        db.select(table.c.month, table.c.document_type_id, table.c.total)
+        .where(table.c.author_id == user_id)).all()
+    db.session.execute(delete(table).where(table.c.author_id == user_id))
+    _increment(table, COUNT_KEYS, Counter({(month, document_type_id, 0): total
+                                           for month, document_type_id, total in rows}))
+
+def _month(column):
+    if db.engine.dialect.name == 'postgresql':
+        return cast(func.date_trunc('month', column), Date)
+    # SQLite keeps dates as 'YYYY-MM-DD' text, like SQLAlchemy writes them
+    return func.date(column, 'start of month')
+
+def backfill():
+    '''Rebuild both rollups from the bills with two grouped queries.'''
+    db.session.execute(delete(BillMonthlyCount))
+    db.session.execute(delete(BillMonthlyTagCount))
+
+    month = _month(Bill.bill_date)
+    document_type_id = func.coalesce(Bill.document_type_id, 0)
+    author_id = func.coalesce(Bill.author_id, 0)
+    db.session.execute(insert(BillMonthlyCount.__table__).from_select(
+        COUNT_KEYS + ('total',),
+        db.select(month, document_type_id, author_id, func.count())
+        .group_by(month, document_type_id, author_id)))
+    db.session.execute(insert(BillMonthlyTagCount.__table__).from_select(
+        TAG_COUNT_KEYS + ('total',),
+        db.select(month, bill_tag.c.tag_id, func.count())
+        .select_from(Bill)
+        .join(bill_tag, bill_tag.c.bill_id == Bill.id)
+        .group_by(month, bill_tag.c.tag_id)))
+    db.session.commit()
+    return db.session.execute(db.select(func.count()).select_from(BillMonthlyCount)).scalar()
+
+@rollups_cli.command('backfill')
+def backfill_command():
+    '''Rebuild the monthly counts from the existing bills.'''
+    click.echo(f'{backfill()} monthly counts written.')
@@ -0,0 +1,83 @@
+import re
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import Float, Integer, text
+
+from .extensions import db
+
+
+search_cli = AppGroup('search', help='Full text index over folio, concept and description.')
+
+def _dialect():
+    return db.engine.dialect.name
+
+def search_tokens(query):
+    return re.findall(r'\w+', query or '')
+
+def index_bill(bill):
+    # Postgres keeps bills.search_vector up to date as a generated column,
+    # only the SQLite FTS5 table has to be written by hand
+    if _dialect() != 'sqlite':
+        return
+    db.session.execute(text('DELETE FROM bills_fts WHERE rowid = :id'), {'id': bill.id})
+    db.session.execute(
+        text('INSERT INTO bills_fts (rowid, folio, bill_concept, description) '
+             'VALUES (:id, :folio, :bill_concept, :description)'),
+        {'id': bill.id, 'folio': bill.folio,
+         'bill_concept': bill.bill_concept, 'description': bill.description})
+
+def unindex_bill(bill_id):
+    if _dialect() != 'sqlite':
+        return
+    db.session.execute(text('DELETE FROM bills_fts WHERE rowid = :id'), {'id': bill_id})
+
+def search_scores(query):
+    '''
+    Subquery of (bill_id, score) for the bills matching every word of the
+    query, a lower score is a better match. Words match as prefixes. Every
+    match is returned, the caller joins in its filters and the keyset
+    pagination limits the page, so filtered searches and facet counts see
+    all of them.
+    Returns None when the query has no words.
+    '''
+    tokens = search_tokens(query)
+    if not tokens:
+        return None
+
+    if _dialect() == 'postgresql':
+        ts_query = ' & '.join(f'{token}:*' for token in tokens)
+        stmt = text(
+            'SELECT bills.id AS bill_id, -ts_rank(bills.search_vector, query) AS score '
+            'FROM bills, to_tsquery(CAST(:config AS regconfig), :query) AS query '
+            'WHERE bills.search_vector @@ query'
+        ).bindparams(config=current_app.config['SEARCH_LANGUAGE'], query=ts_query)
+    else:
+        # Words are quoted so FTS5 operators typed by the user are ignored
+        fts_query = ' '.join(f'"{token}"*' for token in tokens)
+        stmt = text(
+            'SELECT rowid AS bill_id, rank AS score FROM bills_fts '
+            'WHERE bills_fts MATCH :query'
+        ).bindparams(query=fts_query)
+
+    return stmt.columns(bill_id=Integer, score=Float).subquery('search')
+
+def rebuild_index():
+    # Returns False when there is nothing to rebuild (Postgres)
+    if _dialect() != 'sqlite':
+        return False
+    db.session.execute(text('DELETE FROM bills_fts'))
+    db.session.execute(text(
+        'INSERT INTO bills_fts (rowid, folio, bill_concept, description) '
+        'SELECT id, folio, bill_concept, description FROM bills'))
+    db.session.commit()
+    return True
+
+@search_cli.command('reindex')
+def reindex():
+    '''Rebuild the SQLite full text index from the bills table.'''
+    if not rebuild_index():
+        click.echo('Postgres keeps the search vector up to date, nothing to do.')
+        return
+    click.echo('Search index rebuilt.')
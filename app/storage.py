@@ -0,0 +1,294 @@
+import hashlib
+import mimetypes
+import os
+import tempfile
+
+import click
+from flask import Request, abort, current_app, g, has_app_context, request, send_file
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import safe_join
+
+from .config import APP_ROOT_PATH, UPLOAD_DESTINATION
+from .extensions import db
+from .models.models import Blob, FileTombstone
+
+# Uploads are spooled next to the blob store so that storing them
+# is a rename instead of a second copy
+INCOMING_DIR = os.path.join(APP_ROOT_PATH, UPLOAD_DESTINATION, '.incoming')
+
+files_cli = AppGroup('files', help='Stored upload maintenance.')
+
+
+class IngestFile:
+    '''
+    Writable spool file handed to Werkzeug while it parses the multipart
+    body. The checksum and byte count are computed as the upload streams
+    in, and the per file size cap is enforced before it is fully received.
+    '''
+    def __init__(self, max_size):
+        os.makedirs(INCOMING_DIR, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=INCOMING_DIR, delete=False)
+        self.path = self._file.name
+        self.max_size = max_size
+        self.size = 0
+        self._hash = hashlib.sha256()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.discard()
+            raise RequestEntityTooLarge(f'Each file must be smaller than {self.max_size} bytes.')
+        self._hash.update(data)
+        return self._file.write(data)
+
+    @property
+    def checksum(self):
+        return self._hash.hexdigest()
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        # read, seek, tell, close... come from the underlying file
+        return getattr(self._file, name)
+
+class IngestRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = IngestFile(current_app.config['MAX_FILE_SIZE'])
+        g.setdefault('incoming_files', []).append(stream)
+        return stream
+
+def _track_upload(path):
+    # Stored files are removed again if the request ends without a commit
+    g.setdefault('uncommitted_uploads', []).append(path)
+
+def spool_upload(file_storage):
+    '''
+    Returns the IngestFile holding an upload, already hashed and measured.
+    Uploads parsed by IngestRequest are spooled already, any other stream
+    is copied once in UPLOAD_CHUNK_SIZE chunks.
+    '''
+    stream = file_storage.stream
+    if not isinstance(stream, IngestFile):
+        spool = IngestFile(current_app.config['MAX_FILE_SIZE'])
+        g.setdefault('incoming_files', []).append(spool)
+        chunk_size = current_app.config['UPLOAD_CHUNK_SIZE']
+        while chunk := stream.read(chunk_size):
+            spool.write(chunk)
+        stream = spool
+    stream.close()
+    return stream
+
+def spool_local_file(path, chunk_size):
+    '''
+    Copy a file from the local filesystem into an IngestFile, hashing it on
+    the way. Needs no request or app context, so it can run in a thread pool.
+    '''
+    spool = IngestFile(None)
+    try:
+        with open(path, 'rb') as source:
+            while chunk := source.read(chunk_size):
+                spool.write(chunk)
+    except BaseException:
+        spool.discard()
+        raise
+    spool.close()
+    return spool
+
+def blob_path(checksum, extension):
+    # Relative to APP_ROOT_PATH, fanned out by the first two hex digits
+    return os.path.join(UPLOAD_DESTINATION, 'blobs', checksum[:2], checksum + extension.lower())
+
+def store_blob(file_storage):
+    '''
+    Store an upload in the content addressed blob store and return its Blob
+    with the reference taken. Content that is already stored only costs a
+    reference count increment, the spooled copy is dropped.
+    '''
+    spool = spool_upload(file_storage)
+    blob = _reference_blob(spool.checksum)
+    if blob is not None:
+        return blob
+
+    extension = os.path.splitext(file_storage.filename or '')[1]
+    blob = Blob(checksum=spool.checksum, file_url=blob_path(spool.checksum, extension),
+                size=spool.size, ref_count=1)
+    try:
+        # A concurrent request may store the same content first
+        with db.session.begin_nested():
+            db.session.add(blob)
+    except IntegrityError:
+        return _reference_blob(spool.checksum)
+
+    destination = os.path.join(APP_ROOT_PATH, blob.file_url)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(spool.path, destination)
+    _track_upload(destination)
+    return blob
+
+def _reference_blob(checksum):
+    blob_id = db.session.execute(
+        update(Blob)
+        .where(Blob.checksum == checksum)
+        .values(ref_count=Blob.ref_count + 1)
+        .returning(Blob.id)).scalar()
+    if blob_id is None:
+        return None
+    return db.session.get(Blob, blob_id, populate_existing=True)
+
+def release_file(file):
+    '''
+    Delete a File row. Its stored content is tombstoned in the same
+    transaction, once nothing references it, and unlinked later by
+    reap_tombstones, so the request never touches the filesystem.
+    '''
+    db.session.delete(file)
+    if file.blob is None:
+        # Uploaded before the blob store, the path belongs to this file only
+        db.session.add(FileTombstone(file_url=file.file_url))
+        return
+    ref_count = db.session.execute(
+        update(Blob)
+        .where(Blob.id == file.blob_id)
+        .values(ref_count=Blob.ref_count - 1)
+        .returning(Blob.ref_count)).scalar()
+    if ref_count <= 0:
+        db.session.add(FileTombstone(file_url=file.blob.file_url, blob_id=file.blob_id))
+
+def _blob_checksum(file_url):
+    # Inverse of blob_path
+    return os.path.splitext(os.path.basename(file_url))[0]
+
+def _blob_in_use(tombstone):
+    # The blob survived (it was referenced again) or its content was
+    # uploaded again as a new blob since the tombstone was written
+    return db.session.execute(
+        db.select(Blob.id).where(Blob.checksum == _blob_checksum(tombstone.file_url))).first() is not None
+
+def _unlink_tombstoned(tombstone):
+    # Returns whether a file was removed. Raises OSError if it could not be
+    # removed, the savepoint is rolled back and the tombstone kept
+    with db.session.begin_nested():
+        placeholder = None
+        if tombstone.blob_id is not None:
+            # Holds the checksum while the file is unlinked, an upload of the
+            # same content blocks on the unique index until the commit
+            placeholder = Blob(checksum=_blob_checksum(tombstone.file_url),
+                               file_url=tombstone.file_url, size=0, ref_count=0)
+            db.session.add(placeholder)
+            db.session.flush()
+        try:
+            os.remove(os.path.join(APP_ROOT_PATH, tombstone.file_url))
+            removed = True
+        except FileNotFoundError:
+            removed = False
+        if placeholder is not None:
+            db.session.delete(placeholder)
+        db.session.delete(tombstone)
+    return removed
+
+def reap_tombstones(batch_size=None):
+    '''
+    Unlink the files of committed deletions, batch_size tombstones at a time.
+    The blob rows that still have no references are deleted and committed
+    first, then every file is unlinked and its tombstone deleted in its own
+    transaction. A tombstone whose unlink fails stays for the next run.
+    Returns the number of files unlinked.
+    '''
+    batch_size = batch_size or current_app.config['FILE_REAP_BATCH_SIZE']
+    unlinked = 0
+    last_id = 0
+    while True:
+        tombstones = db.session.execute(
+            db.select(FileTombstone).where(FileTombstone.id > last_id)
+            .order_by(FileTombstone.id).limit(batch_size)).scalars().all()
+        if not tombstones:
+            return unlinked
+        last_id = tombstones[-1].id
+
+        pending = []
+        for tombstone in tombstones:
+            if tombstone.blob_id is not None:
+                db.session.execute(delete(Blob).where(Blob.id == tombstone.blob_id, Blob.ref_count <= 0))
+                if _blob_in_use(tombstone):
+                    db.session.delete(tombstone)
+                    continue
+            pending.append(tombstone)
+        db.session.commit()
+
+        for tombstone in pending:
+            try:
+                unlinked += _unlink_tombstoned(tombstone)
+            except IntegrityError:
+                # The same content was stored again since the first commit
+                db.session.delete(tombstone)
+            except OSError as error:
+                current_app.logger.warning('Could not unlink %s, kept for the next run: %s',
+                                           tombstone.file_url, error)
+            db.session.commit()
+
+def send_stored_file(file):
+    '''
+    Response for a stored File with a strong ETag (its checksum),
+    Last-Modified, 304 answers to If-None-Match / If-Modified-Since and
+    Range support. With FILE_OFFLOAD set to 'x-accel' or 'x-sendfile' the
+    bytes are left to the front web server and only headers are sent.
+    '''
+    path = safe_join(APP_ROOT_PATH, file.file_url)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    offload = current_app.config['FILE_OFFLOAD']
+    max_age = current_app.config['FILE_MAX_AGE']
+    if not offload:
+        response = send_file(path, etag=file.checksum or True, conditional=True, max_age=max_age)
+    else:
+        response = current_app.response_class()
+        if offload == 'x-accel':
+            # nginx maps the internal prefix to APP_ROOT_PATH
+            response.headers['X-Accel-Redirect'] = current_app.config['FILE_OFFLOAD_PREFIX'] + file.file_url
+        else:
+            # config.py only accepts x-accel and x-sendfile
+            response.headers['X-Sendfile'] = path
+        response.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response.last_modified = int(os.path.getmtime(path))
+        if file.checksum:
+            response.set_etag(file.checksum)
+        response.cache_control.max_age = max_age
+        # The front server answers Range requests itself
+        response = response.make_conditional(request)
+
+    # Files are only served to logged in users
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+@event.listens_for(Session, 'after_commit')
+def _uploads_committed(session):
+    if has_app_context():
+        g.pop('uncommitted_uploads', None)
+
+def discard_uncommitted_uploads(exc=None):
+    # Spool files nobody claimed and files stored by a request whose
+    # transaction never committed are removed at the end of the request
+    for stream in g.pop('incoming_files', []):
+        stream.discard()
+    for path in g.pop('uncommitted_uploads', []):
+        if os.path.exists(path):
+            os.remove(path)
+
+@files_cli.command('reap')
+@click.option('--batch-size', type=int, help='Tombstones unlinked per transaction.')
+def reap_command(batch_size):
+    '''Unlink the stored files of deleted documents.'''
+    click.echo(f'{reap_tombstones(batch_size)} files unlinked.')
+
+def init_app(app):
+    app.request_class = IngestRequest
+    app.teardown_request(discard_uncommitted_uploads)
@@ -0,0 +1,49 @@
+from array import array
+from itertools import groupby
+from operator import itemgetter
+
+from .cache import VersionedCache
+from .extensions import db
+from .models.models import bill_tag
+
+
+class TagIndex:
+    '''
+    Inverted index of bill_tag: tag id -> sorted array of the ids of the
+    bills carrying it, 4 bytes per pair. Loaded whole with one query over
+    the (tag_id, bill_id) index.
+    '''
+    def __init__(self, postings):
+        self.postings = postings
+
+    @classmethod
+    def load(cls):
+        rows = db.session.execute(
+            db.select(bill_tag.c.tag_id, bill_tag.c.bill_id)
+            .order_by(bill_tag.c.tag_id, bill_tag.c.bill_id))
+        return cls({tag_id: array('I', map(itemgetter(1), pairs))
+                    for tag_id, pairs in groupby(rows, itemgetter(0))})
+
+    def bills(self, tag_id):
+        return self.postings.get(tag_id, array('I'))
+
+    def all_of(self, tag_ids):
+        '''Sorted ids of the bills carrying every tag.'''
+        lists = sorted((self.bills(tag_id) for tag_id in set(tag_ids)), key=len)
+        if not lists:
+            return []
+        # The smallest list bounds the result, the rest only filter it
+        matches = set(lists[0])
+        for bills in lists[1:]:
+            if not matches:
+                break
+            matches.intersection_update(bills)
+        return sorted(matches)
+
+    def any_of(self, tag_ids):
+        '''Sorted ids of the bills carrying at least one of the tags.'''
+        return sorted(set().union(*(self.bills(tag_id) for tag_id in set(tag_ids))))
+
+# Bumped whenever bill_tag rows are added or removed, the index of every
+# worker is reloaded within CACHE_VERSION_TTL
+tag_index = VersionedCache('bill_tags', TagIndex.load)
@@ -0,0 +1,112 @@
+import hashlib
+import hmac
+import secrets
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from flask_login import UserMixin
+from sqlalchemy import update
+
+from .cache import TTLCache, VersionedCache, bump_version
+from .extensions import db
+from .models.models import ApiToken, User
+
+tokens_cli = AppGroup('tokens', help='Bearer tokens of the JSON API.')
+
+TOKEN_PREFIX = 'dm_'
+
+
+class TokenUser(UserMixin):
+    '''
+    Principal of a request authenticated with an API token. A plain object
+    instead of the User row so it can be cached and shared between requests.
+    '''
+    def __init__(self, id, email, name, role_id, token_id):
+        self.id = id
+        self.email = email
+        self.name = name
+        self.role_id = role_id
+        self.token_id = token_id
+
+def token_digest(token):
+    # Tokens are long random strings, a keyed digest is enough to store them,
+    # a password KDF would only slow every API request down. Changing
+    # SECRET_KEY invalidates every issued token.
+    key = current_app.config['SECRET_KEY'].encode()
+    return hmac.new(key, token.encode(), hashlib.sha256).hexdigest()
+
+# digest -> TokenUser. Revoking a token, changing a role or deleting a user
+# bumps 'api_tokens', other workers drop their cache within CACHE_VERSION_TTL
+principals = VersionedCache('api_tokens', lambda: TTLCache(
+    current_app.config['API_TOKEN_CACHE_SIZE'], current_app.config['API_TOKEN_CACHE_TTL']))
+
+def issue_token(user, name):
+    '''Create a token for user and return it, only its digest is stored.'''
+    token = TOKEN_PREFIX + secrets.token_urlsafe(32)
+    db.session.add(ApiToken(user_id=user.id, name=name, token_hash=token_digest(token),
+                            prefix=token[:len(TOKEN_PREFIX) + 6]))
+    return token
+
+def revoke_token(token_id):
+    updated = db.session.execute(
+        update(ApiToken)
+        .where(ApiToken.id == token_id, ApiToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())).rowcount
+    if updated:
+        bump_version('api_tokens')
+    return bool(updated)
+
+def authenticate(token):
+    '''Return the TokenUser of an active token or None.'''
+    if not token.startswith(TOKEN_PREFIX):
+        return None
+    digest = token_digest(token)
+    cache = principals.get()
+    principal = cache.get(digest)
+    if principal is not None:
+        return principal
+
+    row = db.session.execute(
+        db.select(User.id, User.email, User.name, User.role_id, ApiToken.id)
+        .join(ApiToken, ApiToken.user_id == User.id)
+        .where(ApiToken.token_hash == digest, ApiToken.revoked_at.is_(None))).first()
+    if row is None:
+        return None
+    principal = TokenUser(*row)
+    cache.set(digest, principal)
+    return principal
+
+@tokens_cli.command('create')
+@click.argument('email')
+@click.option('--name', required=True, help='What the token is used for.')
+def create_command(email, name):
+    '''Issue a token for the user with EMAIL, it is only shown once.'''
+    user = db.session.execute(db.select(User).where(User.email == email)).scalar()
+    if user is None:
+        raise click.ClickException(f'No user with email {email}.')
+    token = issue_token(user, name)
+    db.session.commit()
+    click.echo(token)
+
+@tokens_cli.command('revoke')
+@click.argument('token_id', type=int)
+def revoke_command(token_id):
+    '''Revoke the token with TOKEN_ID.'''
+    if not revoke_token(token_id):
+        raise click.ClickException(f'No active token with id {token_id}.')
+    db.session.commit()
+    click.echo(f'Token {token_id} revoked.')
+
+@tokens_cli.command('list')
+def list_command():
+    '''List the tokens, revoked ones included.'''
+    rows = db.session.execute(
+        db.select(ApiToken.id, ApiToken.prefix, ApiToken.name, User.email,
+                  ApiToken.created_at, ApiToken.revoked_at)
+        .join(User, User.id == ApiToken.user_id)
+        .order_by(ApiToken.id)).all()
+    for token_id, prefix, name, email, created_at, revoked_at in rows:
+        status = f'revoked {revoked_at:%Y-%m-%d %H:%M}' if revoked_at else 'active'
+        click.echo(f'{token_id}\t{prefix}...\t{email}\t{name}\t{created_at:%Y-%m-%d %H:%M}\t{status}')
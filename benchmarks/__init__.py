@@ -0,0 +1,34 @@
+'''
+Benchmarks for the document manager.
+
+Every script builds the app with create_app against a throwaway database
+(SQLite in a temporary directory unless --db-uri is given) and seeds it
+with synthetic data, so they never touch the real posts.db.
+
+    python -m benchmarks.run --bills 10000 --output results.json
+'''
+import os
+import sys
+import tempfile
+
+# Relative paths given on the command line are resolved against INVOKED_FROM
+INVOKED_FROM = os.getcwd()
+WORKDIR = None
+
+
+def setup_workdir():
+    '''
+    Move into a scratch directory where stored files, previews and profiles
+    land, and return it. app.config resolves APP_ROOT_PATH from the working
+    directory when it is first imported, so every script calls this at the
+    start of main(), before importing the app. Later calls return the same
+    directory.
+    '''
+    global WORKDIR
+    if WORKDIR is None:
+        if 'app.config' in sys.modules:
+            raise RuntimeError('setup_workdir() must run before the app is imported')
+        WORKDIR = tempfile.mkdtemp(prefix='docmanager-bench-')
+        os.makedirs(os.path.join(WORKDIR, 'files'), exist_ok=True)
+        os.chdir(WORKDIR)
+    return WORKDIR
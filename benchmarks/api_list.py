@@ -0,0 +1,60 @@
+'''
+Throughput of the JSON document list, in requests per second of a single
+worker driven through the test client (no network, no WSGI server).
+
+    python -m benchmarks.api_list --bills 10000 --requests 2000
+'''
+import argparse
+import time
+
+from . import setup_workdir
+from .common import make_app
+
+# Query strings a client of /api/v1/bills sends
+SHAPES = {
+    'first page': '',
+    'sparse fields': 'fields=id,folio',
+    'tag filter': 'tags=7',
+    'author + type': 'author=3&document_type=2',
+    'per_page=100': 'per_page=100',
+}
+
+def run(client, query_string, requests):
+    # The second page is fetched too, so cursors are part of the measure
+    cursor = client.get(f'/api/v1/bills?{query_string}').json['next_cursor']
+    url = f'/api/v1/bills?{query_string}&cursor={cursor}' if cursor else f'/api/v1/bills?{query_string}'
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+    return requests / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-uri', help='Empty database to use, defaults to a temporary SQLite file')
+    parser.add_argument('--bills', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--no-page-cache', action='store_true', help='Query the database on every request')
+    args = parser.parse_args()
+
+    setup_workdir()
+    from app.extensions import db
+    from app.models.models import User
+    from app.tokens import issue_token
+    from .seed import seed
+
+    app, _ = make_app(args.db_uri, **({'API_PAGE_CACHE_SIZE': 0} if args.no_page_cache else {}))
+    with app.app_context():
+        print('Seeded', seed(bills=args.bills))
+        # API clients authenticate with a bearer token, not the login session
+        token = issue_token(db.session.get(User, 1), 'benchmark')
+        db.session.commit()
+        db.session.remove()
+
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    for name, query_string in SHAPES.items():
+        print(f'{name:>16}: {run(client, query_string, args.requests):8.0f} req/s')
+
+if __name__ == '__main__':
+    main()
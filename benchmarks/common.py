@@ -0,0 +1,40 @@
+import os
+import statistics
+import tempfile
+import time
+
+from . import setup_workdir
+
+
+def make_app(db_uri=None, **config):
+    '''
+    Build the app against a throwaway database. Without db_uri a SQLite file
+    is created in a new temporary directory under the scratch directory of
+    setup_workdir, which the script must have set up already.
+    '''
+    workdir = tempfile.mkdtemp(dir=setup_workdir())
+    from app import create_app
+    from app.extensions import db
+    if db_uri is None:
+        db_uri = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': db_uri,
+        'WTF_CSRF_ENABLED': False,
+        **config,
+    })
+    with app.app_context():
+        db.create_all()
+    return app, workdir
+
+def timed(fn, repeat=20):
+    # Median and p95 wall time of fn in milliseconds
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
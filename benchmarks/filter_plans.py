@@ -0,0 +1,105 @@
+'''
+Query plans and timings of every FilterBillForm shape before and after
+the filter indexes.
+
+    python -m benchmarks.filter_plans --bills 10000
+
+Without the bill_tag indexes the tag shapes grow quadratically with the
+number of bills (about a minute at 20000 on SQLite), use --plans-only 
+to look at large volumes.
+'''
+import argparse
+
+from sqlalchemy import text
+
+from . import setup_workdir
+from .common import make_app, timed
+
+# Query strings as sent by the filter form of index.html
+SHAPES = {
+    'no filter': '',
+    'folio prefix': 'folio=2019-03',
+    'author': 'author=3',
+    'document type': 'document_type=2',
+    'tag': 'tags=7',
+    'author + tag': 'author=3&tags=7',
+    'document type + tag': 'document_type=2&tags=7',
+    'author + type + folio': 'author=3&document_type=2&folio=2019',
+    'three tags, all': 'tags=7&tags=12&tags=19',
+    'three tags, any': 'tags=7&tags=12&tags=19&tags_match=any',
+}
+
+def filter_indexes():
+    from app.models.models import Bill, bill_tag
+    return [index for table in (Bill.__table__, bill_tag) for index in table.indexes]
+
+def listing_sql(app, query_string):
+    # Same statement get_all issues for the first page
+    from flask import request
+    from app.blueprints.bills import get_filter
+    from app.extensions import db
+    from app.forms.forms import FilterBillForm
+    from app.models.models import Bill
+    with app.test_request_context(f'/documents/?{query_string}'):
+        form = FilterBillForm(request.args)
+        stmt = (db.select(Bill.id).where(get_filter(form))
+                .order_by(Bill.folio.desc(), Bill.id.desc()).limit(11))
+        return str(stmt.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+
+def explain(sql):
+    from app.extensions import db
+    if db.engine.dialect.name == 'sqlite':
+        rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).all()
+        return [row[-1] for row in rows]
+    return [row[0] for row in db.session.execute(text(f'EXPLAIN {sql}')).all()]
+
+def run_shapes(statements, repeat):
+    from app.extensions import db
+    db.session.execute(text('ANALYZE'))
+    results = {}
+    for name, sql in statements.items():
+        results[name] = {'plan': explain(sql)}
+        if repeat:
+            results[name].update(timed(lambda: db.session.execute(text(sql)).all(), repeat))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-uri', help='Empty database to use, defaults to a temporary SQLite file')
+    parser.add_argument('--bills', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--plans-only', action='store_true', help='Skip the timings')
+    args = parser.parse_args()
+    repeat = 0 if args.plans_only else args.repeat
+
+    setup_workdir()
+    from app.extensions import db
+    from .seed import seed
+
+    app, _ = make_app(args.db_uri)
+    with app.app_context():
+        print('Seeded', seed(bills=args.bills))
+        statements = {name: listing_sql(app, qs) for name, qs in SHAPES.items()}
+
+        with db.engine.begin() as connection:
+            for index in filter_indexes():
+                index.drop(connection)
+        before = run_shapes(statements, repeat)
+
+        with db.engine.begin() as connection:
+            for index in filter_indexes():
+                index.create(connection)
+        after = run_shapes(statements, repeat)
+
+    for name in SHAPES:
+        print(f'\n== {name}')
+        for label, result in (('before', before[name]), ('after', after[name])):
+            if 'median_ms' in result:
+                print(f"  {label}: median {result['median_ms']} ms, p95 {result['p95_ms']} ms")
+            else:
+                print(f'  {label}:')
+            for line in result['plan']:
+                print(f'      {line}')
+
+if __name__ == '__main__':
+    main()
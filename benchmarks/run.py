@@ -0,0 +1,156 @@
+'''
+Timed scenarios over the main user paths, written as JSON so runs can be
+compared.
+
+    python -m benchmarks.run --bills 10000 --output after.json --baseline before.json
+
+Every scenario goes through the test client as a logged in administrator
+(no network, no WSGI server). Results hold the median and p95 wall time
+and the SQL statements issued per request.
+'''
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+
+from . import INVOKED_FROM, setup_workdir
+from .common import make_app, timed
+from .filter_plans import SHAPES
+
+
+def statements(app, endpoint):
+    metrics = app.extensions.get('metrics')
+    return metrics.sql_statements[endpoint] if metrics else 0
+
+def scenario(app, endpoint, fn, repeat):
+    # Timings plus the average number of statements of one request
+    before = statements(app, endpoint)
+    result = timed(fn, repeat)
+    result['queries'] = round((statements(app, endpoint) - before) / repeat, 2)
+    return result
+
+def check(response, *codes):
+    codes = codes or (200,)
+    assert response.status_code in codes, (response.status_code, response.data[:200])
+    return response
+
+def scenarios(app, client, args, rng):
+    from app.extensions import db
+    from app.models.models import File
+    from .seed import PASSWORD
+    with app.app_context():
+        file_ids = db.session.execute(db.select(File.id)).scalars().all()
+
+    for name, query_string in SHAPES.items():
+        yield f'list: {name}', 'bills.get_all', lambda qs=query_string: check(client.get(f'/documents/?{qs}'))
+    yield 'list: search', 'bills.get_all', lambda: check(client.get('/documents/?q=renta+pago'))
+    yield 'api list', 'api.list_bills', lambda: check(client.get('/api/v1/bills'))
+    yield 'dashboard', 'dashboard.show', lambda: check(client.get('/dashboard/'))
+    yield 'detail', 'bills.show', lambda: check(client.get(f'/documents/{rng.randint(1, args.bills)}'))
+    if file_ids:
+        yield 'download', 'bills.download_file', lambda: check(
+            client.get(f'/documents/download/{rng.choice(file_ids)}'))
+
+    def create():
+        attachment = rng.randbytes(args.attachment_size)
+        check(client.post('/documents/create', data={
+            'bill_date': '2024-01-02', 'payment_date': '2024-01-03',
+            'bill_concept': 'renta', 'description': 'benchmark',
+            'document_type': '1', 'tags': ['1', '2'],
+            'bill_file_pdf': [(io.BytesIO(b'%PDF-1.4\n' + attachment), 'factura.pdf')],
+            'client_file_image': [(io.BytesIO(b'\x89PNG\r\n\x1a\n' + attachment), 'cliente.png'),
+                                  (io.BytesIO(b'\x89PNG\r\n\x1a\n' + attachment[::-1]), 'cliente2.png')],
+            'deposit_file_image': [(io.BytesIO(b'\x89PNG\r\n\x1a\n' + attachment[1:]), 'deposito.png')],
+        }, content_type='multipart/form-data'), 302)
+    yield 'create', 'bills.add_new_bill', create
+
+    # A fresh client each time so the session starts logged out
+    yield 'login', 'auth.login', lambda: check(app.test_client().post(
+        '/auth/login', data={'email': 'user1@example.com', 'password': PASSWORD}), 302)
+
+def metadata(app, args):
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                  cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  capture_output=True, text=True).stdout.strip()
+    except OSError:
+        revision = ''
+    from app.extensions import db
+    with app.app_context():
+        dialect = db.engine.dialect.name
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': dialect,
+        'volumes': {'users': args.users, 'tags': args.tags, 'document_types': args.document_types,
+                    'bills': args.bills, 'attachments': args.attachments},
+        'repeat': args.repeat,
+    }
+
+def compare(results, baseline):
+    print(f"\n{'scenario':<32}{'baseline':>12}{'now':>12}{'change':>10}")
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        change = (result['median_ms'] - old['median_ms']) / old['median_ms'] * 100 if old['median_ms'] else 0
+        print(f"{name:<32}{old['median_ms']:>10.2f}ms{result['median_ms']:>10.2f}ms{change:>+9.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-uri', help='Empty database to use, defaults to a temporary SQLite file')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--tags', type=int, default=50)
+    parser.add_argument('--document-types', type=int, default=10)
+    parser.add_argument('--bills', type=int, default=10000)
+    parser.add_argument('--attachments', type=int, default=50,
+                        help='Distinct PDFs and images the seeded bills share')
+    parser.add_argument('--attachment-size', type=int, default=64 * 1024)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--random-seed', type=int, default=0)
+    parser.add_argument('--scenario', action='append', help='Only run scenarios starting with this name')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file of a previous run to compare against')
+    args = parser.parse_args()
+
+    setup_workdir()
+    from app.extensions import db
+    from .seed import PASSWORD, seed
+
+    # The statement counts come from the request metrics
+    app, _ = make_app(args.db_uri, METRICS_ENABLED=True)
+    with app.app_context():
+        print('Seeded', seed(users=args.users, tags=args.tags, document_types=args.document_types,
+                             bills=args.bills, attachments=args.attachments,
+                             attachment_size=args.attachment_size, random_seed=args.random_seed))
+        db.session.remove()
+
+    client = app.test_client()
+    check(client.post('/auth/login', data={'email': 'user1@example.com', 'password': PASSWORD}), 302)
+
+    rng = random.Random(args.random_seed)
+    results = {}
+    for name, endpoint, fn in scenarios(app, client, args, rng):
+        if args.scenario and not any(name.startswith(prefix) for prefix in args.scenario):
+            continue
+        # One untimed call warms caches and connections
+        fn()
+        results[name] = scenario(app, endpoint, fn, args.repeat)
+        print(f"{name:<32} median {results[name]['median_ms']:>8.2f} ms  "
+              f"p95 {results[name]['p95_ms']:>8.2f} ms  {results[name]['queries']} queries")
+
+    if args.output:
+        with open(os.path.join(INVOKED_FROM, args.output), 'w') as output:
+            json.dump({'meta': metadata(app, args), 'results': results}, output, indent=2)
+    if args.baseline:
+        with open(os.path.join(INVOKED_FROM, args.baseline)) as baseline:
+            compare(results, json.load(baseline)['results'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import datetime
+import hashlib
+import os
+import random
+
+from sqlalchemy import insert, text
+from werkzeug.security import generate_password_hash
+
+from app.config import APP_ROOT_PATH
+from app.extensions import db
+from app.models.models import PERMISSIONS, Bill, Blob, DocumentType, File, FileGroup, Role, Tag, User, bill_tag
+from app.listing import rebuild_listing
+from app.rollups import backfill
+from app.search import rebuild_index
+from app.storage import blob_path
+
+# Password of every seeded user
+PASSWORD = 'benchmark'
+
+WORDS = ('renta', 'pago', 'cliente', 'deposito', 'factura', 'servicio', 'mantenimiento',
+         'honorarios', 'anticipo', 'liquidacion', 'transferencia', 'efectivo', 'credito',
+         'nomina', 'material', 'transporte', 'papeleria', 'software', 'licencia', 'consultoria')
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def _insert(table, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(insert(table), rows[start:start + batch_size])
+
+def _attachment_pool(rng, count, size, extension, header):
+    # Distinct stored contents, written to the blob store like uploads
+    blobs = []
+    for _ in range(count):
+        content = header + rng.randbytes(max(0, size - len(header)))
+        checksum = hashlib.sha256(content).hexdigest()
+        file_url = blob_path(checksum, extension)
+        path = os.path.join(APP_ROOT_PATH, file_url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as stored:
+            stored.write(content)
+        blobs.append(dict(checksum=checksum, file_url=file_url, size=len(content), ref_count=0))
+    return blobs
+
+def seed(users=20, tags=50, document_types=10, bills=10000, tags_per_bill=3,
+         attachments=0, attachment_size=64 * 1024, random_seed=0, batch_size=5000):
+    '''
+    Fill an empty database with synthetic data using executemany inserts.
+    Must run inside an app context. Users are named user<N>@example.com.
+    With attachments > 0 every bill gets one PDF and two deposit images,
+    drawn from that many distinct contents of each kind.
+    '''
+    rng = random.Random(random_seed)
+
+    admin = Role(role_title='admin', role_description='Benchmark administrator',
+                 **{permission: True for permission in PERMISSIONS})
+    db.session.add(admin)
+    db.session.flush()
+
+    password = generate_password_hash(PASSWORD, method='pbkdf2:sha256', salt_length=8)
+    _insert(User, [dict(id=i, email=f'user{i}@example.com', name=f'Usuario {i}',
+                        password=password, role_id=admin.id)
+                   for i in range(1, users + 1)], batch_size)
+    _insert(Tag, [dict(id=i, name=f'etiqueta-{i}', is_active=True)
+                  for i in range(1, tags + 1)], batch_size)
+    _insert(DocumentType, [dict(id=i, name=f'tipo-{i}', is_active=True)
+                           for i in range(1, document_types + 1)], batch_size)
+
+    start_date = datetime.date(2015, 1, 1)
+    bill_rows = []
+    tag_rows = []
+    for i in range(1, bills + 1):
+        bill_date = start_date + datetime.timedelta(days=rng.randrange(3650))
+        bill_rows.append(dict(
+            id=i,
+            author_id=rng.randint(1, users),
+            document_type_id=rng.randint(1, document_types),
+            folio=f'{bill_date.isoformat()}_{i:08d}',
+            payment_date=bill_date + datetime.timedelta(days=rng.randrange(60)),
+            bill_date=bill_date,
+            bill_concept=_sentence(rng, 4),
+            description=_sentence(rng, 12),
+        ))
+        for tag_id in rng.sample(range(1, tags + 1), min(tags_per_bill, tags)):
+            tag_rows.append(dict(tag_id=tag_id, bill_id=i))
+    file_rows = []
+    blob_rows = []
+    if attachments:
+        pdfs = _attachment_pool(rng, attachments, attachment_size, '.pdf', b'%PDF-1.4\n')
+        images = _attachment_pool(rng, attachments, attachment_size, '.png', b'\x89PNG\r\n\x1a\n')
+        blob_rows = pdfs + images
+        for id, blob in enumerate(blob_rows, start=1):
+            blob['id'] = id
+        # One file per group, the group and file of a bill share their ids
+        for bill in bill_rows:
+            for offset, (column, pool) in enumerate((('bill_pdf_id', pdfs),
+                                                     ('client_deposit_image_id', images),
+                                                     ('deposit_image_id', images))):
+                id = (bill['id'] - 1) * 3 + offset + 1
+                blob = rng.choice(pool)
+                blob['ref_count'] += 1
+                bill[column] = id
+                file_rows.append(dict(id=id, id_group=id, file_url=blob['file_url'], checksum=blob['checksum'],
+                                      size=blob['size'], blob_id=blob['id']))
+        _insert(Blob, blob_rows, batch_size)
+        _insert(FileGroup, [dict(id=row['id']) for row in file_rows], batch_size)
+        _insert(File, file_rows, batch_size)
+
+    _insert(Bill, bill_rows, batch_size)
+    _insert(bill_tag, tag_rows, batch_size)
+    if db.engine.dialect.name == 'postgresql':
+        # Explicit ids were inserted, move the sequences past them
+        for table in ('users', 'tags', 'document_types', 'bills', 'blobs', 'files_groups', 'files'):
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"))
+    db.session.commit()
+
+    rebuild_index()
+    rebuild_listing()
+    backfill()
+    return dict(users=users, tags=tags, document_types=document_types, bills=bills,
+                bill_tags=len(tag_rows), files=len(file_rows), blobs=len(blob_rows))
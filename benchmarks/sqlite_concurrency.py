@@ -0,0 +1,94 @@
+'''
+Write throughput of concurrent worker processes sharing one SQLite file,
+with the SQLite defaults and with the pragmas set by app.database
+(WAL, synchronous=NORMAL, busy_timeout, mmap).
+
+    python -m benchmarks.sqlite_concurrency --processes 4 --seconds 10
+
+Each process builds its own app, like a gunicorn worker, and loops over
+one insert and commit of a bill followed by the first page of the list
+query. Failed commits are counted, 'database is locked' included.
+'''
+import argparse
+import datetime
+import multiprocessing
+import os
+import tempfile
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from . import setup_workdir
+
+DEFAULTS = {
+    'SQLITE_JOURNAL_MODE': '',
+    'SQLITE_SYNCHRONOUS': '',
+    'SQLITE_BUSY_TIMEOUT': 0,
+    'SQLITE_MMAP_SIZE': 0,
+}
+
+def writer(db_uri, config, seconds, start_at, results):
+    # Spawned processes start in the scratch directory of the parent
+    from app import create_app
+    from app.extensions import db
+    from app.models.models import Bill
+    app = create_app({'SQLALCHEMY_DATABASE_URI': db_uri, **config})
+    commits = errors = 0
+    with app.app_context():
+        db.session.execute(db.select(Bill.id).limit(1)).all()
+        while time.time() < start_at:
+            time.sleep(0.01)
+        deadline = start_at + seconds
+        today = datetime.date.today()
+        while time.time() < deadline:
+            try:
+                db.session.add(Bill(author_id=1, document_type_id=1, folio=f'bench-{os.getpid()}-{commits}',
+                                    payment_date=today, bill_date=today, bill_concept='', description=''))
+                db.session.commit()
+                commits += 1
+                db.session.execute(db.select(Bill.id).order_by(Bill.folio.desc(), Bill.id.desc()).limit(11)).all()
+                db.session.commit()
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+    results.put((commits, errors))
+
+def run(processes, seconds, config):
+    from app import create_app
+    from app.extensions import db
+    from .seed import seed
+    workdir = tempfile.mkdtemp(dir=setup_workdir())
+    db_uri = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': db_uri, **config})
+    with app.app_context():
+        db.create_all()
+        seed(bills=1000)
+        db.engine.dispose()
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    start_at = time.time() + 5
+    workers = [context.Process(target=writer, args=(db_uri, config, seconds, start_at, results))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    totals = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    commits = sum(commits for commits, _ in totals)
+    errors = sum(errors for _, errors in totals)
+    return commits / seconds, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    setup_workdir()
+    for name, config in (('sqlite defaults', DEFAULTS), ('tuned pragmas', {})):
+        per_second, errors = run(args.processes, args.seconds, config)
+        print(f'{name:>16}: {per_second:8.1f} commits/s, {errors} failed')
+
+if __name__ == '__main__':
+    main()
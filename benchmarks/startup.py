@@ -0,0 +1,58 @@
+'''
+Worker boot time: importing the app package plus create_app, measured in
+fresh interpreters like a gunicorn worker starting. Exits with status 1
+when the median goes over the budget. Wall clock timings are too noisy
+for CI, tests/test_startup.py only checks that boot skips the database.
+
+    python -m benchmarks.startup --budget-ms 1000
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Median milliseconds of import plus create_app a worker may take to boot
+BUDGET_MS = 1000
+
+# Runs in the child interpreter, the database is never touched at boot
+PROBE = '''
+import json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+done = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'create_app_ms': (done - imported) * 1000}))
+'''
+
+def measure(runs):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workdir = tempfile.mkdtemp(prefix='docmanager-bench-')
+    env = dict(os.environ, PYTHONPATH=root, DB_URI='sqlite:///' + os.path.join(workdir, 'missing.db'))
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=workdir, env=env,
+                                check=True, capture_output=True, text=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: round(statistics.median(sample[key] for sample in samples), 1)
+            for key in ('import_ms', 'create_app_ms')}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS,
+                        help='Maximum median of import plus create_app')
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    total = result['import_ms'] + result['create_app_ms']
+    print(f"import {result['import_ms']} ms, create_app {result['create_app_ms']} ms, "
+          f"total {total:.1f} ms (budget {args.budget_ms} ms)")
+    if total > args.budget_ms:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+'''
+Multi tag filters answered by the per worker tag index compared with the
+same filters written as one EXISTS subquery per tag.
+
+    python -m benchmarks.tag_index --bills 100000 --tags 200
+
+Reports the time to load the index, to intersect or unite the id lists
+of 1 to 5 tags, and to count the matching bills with the EXISTS form.
+'''
+import argparse
+import random
+
+from sqlalchemy import and_, func, or_
+
+from . import setup_workdir
+from .common import make_app, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-uri', help='Empty database to use, defaults to a temporary SQLite file')
+    parser.add_argument('--bills', type=int, default=100000)
+    parser.add_argument('--tags', type=int, default=50)
+    parser.add_argument('--tags-per-bill', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_workdir()
+    from app.extensions import db
+    from app.models.models import Bill
+    from app.tag_index import TagIndex
+    from .seed import seed
+
+    app, _ = make_app(args.db_uri)
+    rng = random.Random(0)
+    with app.app_context():
+        print('Seeded', seed(bills=args.bills, tags=args.tags, tags_per_bill=args.tags_per_bill))
+        load = timed(TagIndex.load, max(1, args.repeat // 4))
+        index = TagIndex.load()
+        pairs = sum(len(bills) for bills in index.postings.values())
+        print(f"load: median {load['median_ms']} ms for {pairs} pairs, "
+              f"{pairs * 4 / 1024 / 1024:.1f} MiB of ids")
+
+        for count in range(1, 6):
+            tag_ids = rng.sample(range(1, args.tags + 1), count)
+            for mode, combine, lookup in (('all', and_, index.all_of), ('any', or_, index.any_of)):
+                matches = len(lookup(tag_ids))
+                in_memory = timed(lambda: lookup(tag_ids), args.repeat)
+                exists = combine(*[Bill.tags.any(id=tag_id) for tag_id in tag_ids])
+                stmt = db.select(func.count()).select_from(Bill).where(exists)
+                database = timed(lambda: db.session.execute(stmt).scalar(), args.repeat)
+                print(f"{count} tags, {mode:>3}: {matches:>7} bills  index {in_memory['median_ms']:>9.3f} ms  "
+                      f"EXISTS {database['median_ms']:>9.3f} ms")
+
+if __name__ == '__main__':
+    main()
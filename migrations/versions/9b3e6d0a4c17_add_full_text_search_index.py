@@ -0,0 +1,49 @@
+"""Add full text search index over folio, concept and description
+
+Revision ID: 9b3e6d0a4c17
+Revises: 5f1c2a9d7e40
+Create Date: 2026-10-18 13:05:42.118306
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e6d0a4c17'
+down_revision = '5f1c2a9d7e40'
+branch_labels = None
+depends_on = None
+
+# Must match SEARCH_LANGUAGE in app/config.py
+LANGUAGE = 'spanish'
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE bills_fts USING fts5("
+            "folio, bill_concept, description, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        op.execute("INSERT INTO bills_fts (bills_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')")
+        op.execute(
+            "INSERT INTO bills_fts (rowid, folio, bill_concept, description) "
+            "SELECT id, folio, bill_concept, description FROM bills"
+        )
+    elif dialect == 'postgresql':
+        op.execute(
+            "ALTER TABLE bills ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            f"setweight(to_tsvector('{LANGUAGE}', coalesce(folio, '')), 'A') || "
+            f"setweight(to_tsvector('{LANGUAGE}', coalesce(bill_concept, '')), 'B') || "
+            f"setweight(to_tsvector('{LANGUAGE}', coalesce(description, '')), 'C')) STORED"
+        )
+        op.execute("CREATE INDEX ix_bills_search_vector ON bills USING GIN (search_vector)")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS bills_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_bills_search_vector")
+        op.execute("ALTER TABLE bills DROP COLUMN IF EXISTS search_vector")
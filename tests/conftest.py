@@ -0,0 +1,72 @@
+import datetime
+
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from app.extensions import db
+from app.listing import rebuild_listing
+from app.models.models import PERMISSIONS, Bill, DocumentType, Role, Tag, User
+from app.rollups import backfill
+
+PASSWORD = 'secreto'
+
+
+def seed(bills=30):
+    # An administrator, a few options and bills carrying two tags each
+    admin = Role(role_title='admin', role_description='Administrador',
+                 **{permission: True for permission in PERMISSIONS})
+    user = User(email='admin@example.com', name='Admin', role=admin,
+                password=generate_password_hash(PASSWORD, method='pbkdf2:sha256', salt_length=8))
+    tags = [Tag(name=f'etiqueta-{i}', is_active=True) for i in range(1, 4)]
+    document_type = DocumentType(name='Factura', is_active=True)
+    db.session.add_all([admin, user, document_type, *tags])
+    for i in range(1, bills + 1):
+        bill_date = datetime.date(2024, 1, 1) + datetime.timedelta(days=i)
+        db.session.add(Bill(folio=f'{bill_date.isoformat()}_{i:08d}', bill_date=bill_date,
+                            payment_date=bill_date, bill_concept=f'pago renta {i}',
+                            description='descripcion de prueba', author=user,
+                            document_type=document_type, tags=[tags[i % 3], tags[(i + 1) % 3]]))
+    db.session.commit()
+    rebuild_listing()
+    backfill()
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.db'),
+        'WTF_CSRF_ENABLED': False,
+        'FRAGMENT_CACHE_DIR': str(tmp_path / 'fragments'),
+    })
+    with app.app_context():
+        db.create_all()
+        seed()
+    return app
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    response = client.post('/auth/login', data=dict(email='admin@example.com', password=PASSWORD))
+    assert response.status_code == 302
+    # Loads the per worker caches (permissions, option lists) like any
+    # earlier request of a running worker would
+    client.get('/documents/')
+    return client
+
+@pytest.fixture
+def statements(app):
+    '''Call as statements(fn), returns fn's result and the SQL statements it issued.'''
+    def count(fn):
+        issued = []
+        with app.app_context():
+            engine = db.engine
+        listener = lambda conn, cursor, statement, *args: issued.append(statement)
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            result = fn()
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+        return result, len(issued)
+    return count
@@ -0,0 +1,46 @@
+import pytest
+
+from app.extensions import db
+from app.listing import unlist_bill
+from app.models.models import Bill, User
+from app.pagination import encode_cursor
+from app.tokens import issue_token
+
+
+@pytest.fixture
+def api_client(app):
+    with app.app_context():
+        token = issue_token(db.session.get(User, 1), 'pruebas')
+        db.session.commit()
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    # Loads the token and the permissions into the worker caches
+    client.get('/api/v1/tags')
+    return client
+
+def test_cached_page_issues_no_query(api_client, statements):
+    first = api_client.get('/api/v1/bills?per_page=5')
+    response, count = statements(lambda: api_client.get('/api/v1/bills?per_page=5'))
+    assert response.status_code == 200
+    assert response.json == first.json
+    assert response.get_etag() == first.get_etag()
+    assert count == 0
+
+def test_cached_page_revalidates(api_client):
+    etag = api_client.get('/api/v1/bills').get_etag()[0]
+    response = api_client.get('/api/v1/bills', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+
+def test_cached_pages_follow_the_listing(app, api_client):
+    ids = [bill['id'] for bill in api_client.get('/api/v1/bills?fields=id').json['data']]
+    with app.app_context():
+        unlist_bill(ids[0])
+        db.session.delete(db.session.get(Bill, ids[0]))
+        db.session.commit()
+    assert ids[0] not in [bill['id'] for bill in api_client.get('/api/v1/bills?fields=id').json['data']]
+
+def test_malformed_cursor_returns_first_page(api_client):
+    first = api_client.get('/api/v1/bills?per_page=5')
+    response = api_client.get(f'/api/v1/bills?per_page=5&cursor={encode_cursor([[1], {}], "next")}')
+    assert response.status_code == 200
+    assert response.json['data'] == first.json['data']
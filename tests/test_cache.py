@@ -0,0 +1,14 @@
+from app.cache import bump_version, read_version
+from app.extensions import db
+
+
+def test_bump_version_creates_and_increments(app):
+    with app.app_context():
+        assert read_version('pruebas') == 0
+        bump_version('pruebas')
+        db.session.commit()
+        assert read_version('pruebas') == 1
+        bump_version('pruebas')
+        bump_version('pruebas')
+        db.session.commit()
+        assert read_version('pruebas') == 3
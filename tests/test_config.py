@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_config(**env):
+    # Settings are read when app.config is first imported, so in a fresh interpreter
+    return subprocess.run([sys.executable, '-c', 'import app.config'], cwd=ROOT,
+                          env=dict(os.environ, **env), capture_output=True, text=True)
+
+@pytest.mark.parametrize('mode', ['', 'x-accel', 'x-sendfile'])
+def test_file_offload_modes(mode):
+    assert load_config(FILE_OFFLOAD=mode).returncode == 0
+
+def test_unknown_file_offload_fails_at_load():
+    result = load_config(FILE_OFFLOAD='nginx')
+    assert result.returncode != 0
+    assert 'FILE_OFFLOAD' in result.stderr
@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.mark.parametrize('year', ['0', '-5', '10000', 'abc'])
+def test_out_of_range_year_shows_the_default(client, year):
+    response = client.get(f'/dashboard/?year={year}')
+    assert response.status_code == 200
+    assert b'2024' in response.data
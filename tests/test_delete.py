@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import event
+
+from app.extensions import db
+from app.models.models import Bill, Blob, File, FileGroup, FileTombstone
+
+
+@pytest.fixture
+def foreign_keys(app):
+    # SQLite only enforces them when asked, like Postgres always does
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'connect',
+                 lambda dbapi_connection, record: dbapi_connection.execute('PRAGMA foreign_keys=ON'))
+    engine.dispose()
+
+def attach_files(bill_id):
+    bill = db.session.get(Bill, bill_id)
+    shared = Blob(checksum='a' * 64, file_url='files/blobs/aa/a.pdf', size=1, ref_count=0)
+    for column in ('bill_pdf', 'client_deposit_image', 'deposit_image'):
+        group = FileGroup()
+        shared.ref_count += 1
+        group.files.append(File(file_url=shared.file_url, checksum=shared.checksum, size=1, blob=shared))
+        setattr(bill, column, group)
+    db.session.add(shared)
+    db.session.commit()
+
+def test_delete_bill_with_foreign_keys(app, client, foreign_keys):
+    with app.app_context():
+        attach_files(1)
+    assert client.get('/documents/delete/1').status_code == 302
+    with app.app_context():
+        assert db.session.get(Bill, 1) is None
+        assert db.session.execute(db.select(File)).all() == []
+        assert db.session.execute(db.select(FileGroup)).all() == []
+        blob = db.session.execute(db.select(Blob)).scalar_one()
+        assert blob.ref_count == 0
+        tombstone = db.session.execute(db.select(FileTombstone)).scalar_one()
+        assert tombstone.blob_id == blob.id
@@ -0,0 +1,29 @@
+import re
+
+from app.extensions import db
+from app.listing import unlist_bill
+
+
+def type_count(html):
+    # Count shown next to the only document type in the filter select
+    return int(re.search(r'Factura \((\d+)\)', html).group(1))
+
+def test_unfiltered_counts_are_cached(client, statements):
+    response, count = statements(lambda: client.get('/documents/'))
+    assert type_count(response.data.decode()) == 30
+    # The user, the page, no grouped count
+    assert count == 2
+
+def test_cached_counts_follow_the_listing(app, client):
+    client.get('/documents/?author=1')
+    with app.app_context():
+        unlist_bill(1)
+        db.session.commit()
+    assert type_count(client.get('/documents/').data.decode()) == 29
+    assert type_count(client.get('/documents/?author=1').data.decode()) == 29
+
+def test_combined_filters_are_counted(client, statements):
+    client.get('/documents/?author=1&document_type=1')
+    response, count = statements(lambda: client.get('/documents/?author=1&document_type=1'))
+    assert type_count(response.data.decode()) == 30
+    assert count == 3
@@ -0,0 +1,19 @@
+import pytest
+
+
+@pytest.mark.parametrize('query_string', ['author=abc', 'document_type=1x', 'tags=abc', 'author='])
+def test_list_ignores_malformed_filters(client, query_string):
+    response = client.get(f'/documents/?{query_string}')
+    assert response.status_code == 200
+    assert b'pago renta' in response.data
+
+@pytest.mark.parametrize('query_string', ['author=abc', 'document_type=1x', 'tags=abc', 'date_from=ayer'])
+def test_api_rejects_malformed_filters(client, query_string):
+    response = client.get(f'/api/v1/bills?{query_string}')
+    assert response.status_code == 400
+    assert query_string.split('=')[0] in response.json['error']
+
+def test_api_filters(client):
+    response = client.get('/api/v1/bills?author=1&document_type=1&folio=&per_page=5')
+    assert response.status_code == 200
+    assert len(response.json['data']) == 5
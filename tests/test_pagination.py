@@ -0,0 +1,33 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import Column, Date, Integer
+
+from app.pagination import decode_cursor, encode_cursor
+
+ISSUED = Column('issued', Date)
+ID = Column('id', Integer)
+ORDER_BY = [(ISSUED, True), (ID, True)]
+
+
+def test_cursor_round_trip_keeps_dates():
+    token = encode_cursor((date(2024, 3, 1), 7), 'prev')
+    assert decode_cursor(token, ORDER_BY) == ('prev', [date(2024, 3, 1), 7])
+
+@pytest.mark.parametrize('payload', [
+    ('next', [7]),
+    ('next', ['2024-03-01', 7, 8]),
+    ('next', [['2024-03-01'], 7]),
+    ('next', [{'id': 7}, 7]),
+    ('next', ['marzo', 7]),
+    ('back', ['2024-03-01', 7]),
+])
+def test_malformed_cursor_restarts(payload):
+    direction, values = payload
+    token = encode_cursor(values, direction)
+    assert decode_cursor(token, ORDER_BY) == ('next', None)
+    assert decode_cursor('no es base64!', ORDER_BY) == ('next', None)
+
+def test_listing_ignores_malformed_cursor(client):
+    token = encode_cursor([{'folio': 1}, 2], 'next')
+    assert client.get(f'/documents/?cursor={token}').status_code == 200
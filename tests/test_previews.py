@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+from app import previews
+
+# Pillow is optional
+Image = pytest.importorskip('PIL.Image')
+
+
+def test_failed_save_leaves_no_partial_file(tmp_path, monkeypatch):
+    source = tmp_path / 'foto.png'
+    Image.new('RGB', (64, 64)).save(source)
+    monkeypatch.setattr(previews, 'PREVIEW_DIR', str(tmp_path / 'previews'))
+
+    def full_disk(*args, **kwargs):
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setattr(Image.Image, 'save', full_disk)
+
+    destination = tmp_path / 'previews' / 'foto-32.jpg'
+    with pytest.raises(OSError):
+        previews.generate_preview(str(source), str(destination), 32)
+    assert os.listdir(tmp_path / 'previews') == []
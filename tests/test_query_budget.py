@@ -0,0 +1,27 @@
+# Statements issued by the document list and detail pages once the per
+# worker caches are warm. QUERY_LIMITS only raises over the configured
+# limit, these pin what the pages cost today.
+BUDGET = 5
+
+
+def test_list_query_budget(client, statements):
+    response, count = statements(lambda: client.get('/documents/'))
+    assert response.status_code == 200
+    assert b'pago renta' in response.data
+    assert count <= BUDGET
+
+def test_filtered_list_query_budget(client, statements):
+    response, count = statements(lambda: client.get('/documents/?document_type=1&tags=1'))
+    assert response.status_code == 200
+    assert count <= BUDGET
+
+def test_show_query_budget(client, statements):
+    response, count = statements(lambda: client.get('/documents/1'))
+    assert response.status_code == 200
+    assert count <= BUDGET
+
+def test_cached_show_query_budget(client, statements):
+    client.get('/documents/1')
+    response, count = statements(lambda: client.get('/documents/1'))
+    assert response.status_code == 200
+    assert count <= BUDGET
@@ -0,0 +1,12 @@
+import re
+
+from app.search import rebuild_index
+
+
+def test_filtered_search_sees_every_match(app, client):
+    with app.app_context():
+        rebuild_index()
+    html = client.get('/documents/?q=renta&document_type=1&count=1').data.decode()
+    # Every seeded bill matches, the facet counts are not capped either
+    assert re.search(r'Factura \((\d+)\)', html).group(1) == '30'
+    assert re.search(r'Admin \((\d+)\)', html).group(1) == '30'
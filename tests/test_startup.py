@@ -0,0 +1,14 @@
+import os
+import subprocess
+import sys
+
+
+def test_worker_boot_skips_the_database(tmp_path):
+    # Fresh interpreter, the way a gunicorn worker boots
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    database = tmp_path / 'missing.db'
+    env = dict(os.environ, PYTHONPATH=root, DB_URI=f'sqlite:///{database}')
+    subprocess.run([sys.executable, '-c', 'from app import create_app; create_app()'],
+                   cwd=tmp_path, env=env, check=True)
+    # No create_all or integrity probe, SQLite would have created the file
+    assert not database.exists()